@@ -1,22 +1,54 @@
 import pandas as pd
-from dash import Dash, dcc, html, dash_table, Input, Output
+import numpy as np
+from dash import Dash, dcc, html, dash_table, Input, Output, State, ALL, ctx, no_update
+from flask import Response, g, jsonify, request, send_file
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import plotly.graph_objects as go
 import io
+import json
 import os
 import base64
+import bisect
+import fcntl
+import gzip
+import hashlib
+import math
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import zipfile
+import threading
+import time
+import unicodedata
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html import unescape
+from urllib.parse import urljoin
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from xml.etree import ElementTree
+
+from lector_hojas import LECTORES_EXCEL, leer_hoja_pandas
 
 # ================================
 #  FUNCIONES AUXILIARES
 # ================================
-def normalizar_columnas(df):
-    df.columns = (
-        df.columns.str.replace("\n", " ")
+def normalizar_nombres(columnas):
+    return (
+        columnas.str.replace("\n", " ")
         .str.replace("  ", " ")
         .str.upper()
         .str.strip()
     )
+
+def normalizar_columnas(df):
+    df.columns = normalizar_nombres(df.columns)
     return df
 
 def limpiar_riesgo(valor):
@@ -32,12 +64,12 @@ def limpiar_riesgo(valor):
     else:
         return "NO ENCONTRADO"
 
-def comparar_riesgo(row):
-    r1, r2 = row["RIESGO_2025_1"], row["RIESGO_2025_2"]
+def comparar_riesgo(r1, r2, par):
+    inicial, final = par
     if r1 in ["BAJO", "MEDIO", "ALTO"] and r2 == "NO ENCONTRADO":
-        return "SOLO EN 2025-1"
+        return f"SOLO EN {inicial}"
     elif r1 == "NO ENCONTRADO" and r2 in ["BAJO", "MEDIO", "ALTO"]:
-        return "SOLO EN 2025-2"
+        return f"SOLO EN {final}"
     elif r1 == r2:
         return "SE MANTUVO"
     elif (r1 == "ALTO" and r2 in ["MEDIO", "BAJO"]) or (r1 == "MEDIO" and r2 == "BAJO"):
@@ -48,88 +80,813 @@ def comparar_riesgo(row):
         return "OTRO"
 
 # ================================
-#  LEER BASE BECARIOS
+#  CLASIFICACIÓN VECTORIZADA
 # ================================
-try:
-    file_id = "1OOiHkMC4XOXgFBwId1hjKMfBt7QuY2lj"  # ID de BECARIOS
-    url = f"https://drive.google.com/uc?export=download&id={file_id}"
-
-    df_becarios = pd.read_excel(url, sheet_name="BECARIOS")
-    df_becarios = normalizar_columnas(df_becarios)
-
-    # Normalizar columnas de riesgo
-    col_riesgo1 = [c for c in df_becarios.columns if "2025-1" in c][0]
-    col_riesgo2 = [c for c in df_becarios.columns if "2025-2" in c][0]
-
-    df_becarios["RIESGO_2025_1"] = df_becarios[col_riesgo1].apply(limpiar_riesgo)
-    df_becarios["RIESGO_2025_2"] = df_becarios[col_riesgo2].apply(limpiar_riesgo)
-
-    # Calcular evolución
-    df_becarios["EVOLUCION"] = df_becarios.apply(comparar_riesgo, axis=1)
-
-except Exception as e:
-    print(f"Error al cargar datos: {e}")
-    # Crear datos de ejemplo en caso de error
-    df_becarios = pd.DataFrame({
-        'APELLIDOS Y NOMBRES': ['Estudiante 1', 'Estudiante 2', 'Estudiante 3'],
-        'TIPO DE BENEFICIO': ['BECA', 'CREDITO', 'BECA'],
-        'RIESGO_2025_1': ['ALTO', 'MEDIO', 'BAJO'],
-        'RIESGO_2025_2': ['MEDIO', 'MEDIO', 'BAJO'],
-        'EVOLUCION': ['MEJORO', 'SE MANTUVO', 'SE MANTUVO']
-    })
+# Códigos ordenados de riesgo: 0 = sin dato, 1 = BAJO, 2 = MEDIO, 3 = ALTO
+NIVELES_RIESGO = np.array(["NO ENCONTRADO", "BAJO", "MEDIO", "ALTO"], dtype=object)
+NIVELES_PSICOLOGICO = np.array(["NO LLENARON ENCUESTA", "BAJO", "MEDIO", "ALTO"], dtype=object)
+_CODIGO_NIVEL = {nivel: codigo for codigo, nivel in enumerate(NIVELES_RIESGO)}
+
+def etiquetas_evolucion(par):
+    """Etiquetas de evolución entre un par (inicial, final) de períodos, en el orden de sus códigos"""
+    inicial, final = par
+    return np.array(
+        ["MEJORO", "EMPEORO", "SE MANTUVO", f"SOLO EN {inicial}", f"SOLO EN {final}", "OTRO"], dtype=object
+    )
+
+# Los códigos de evolución no dependen del par; solo sus etiquetas
+_PAR_GENERICO = ("INICIAL", "FINAL")
+_CODIGO_EVOLUCION = {evolucion: codigo for codigo, evolucion in enumerate(etiquetas_evolucion(_PAR_GENERICO))}
+
+# Tabla de transición [código inicial, código final] -> código de evolución.
+# Se genera con comparar_riesgo para conservar exactamente las mismas etiquetas.
+TABLA_EVOLUCION = np.array([
+    [_CODIGO_EVOLUCION[comparar_riesgo(r1, r2, _PAR_GENERICO)] for r2 in NIVELES_RIESGO]
+    for r1 in NIVELES_RIESGO
+], dtype=np.int8)
+
+def clasificar_riesgo(serie):
+    """
+    Devuelve los códigos de riesgo (int8) de una columna cruda. limpiar_riesgo
+    solo se evalúa sobre los valores distintos, no fila por fila
+    """
+    codigos, unicos = pd.factorize(serie)
+    # El código -1 (valor vacío) toma el último elemento: 0 = sin dato
+    codigos_unicos = np.array([_CODIGO_NIVEL[limpiar_riesgo(v)] for v in unicos] + [0], dtype=np.int8)
+    return codigos_unicos[codigos]
+
+def calcular_evolucion(codigos_1, codigos_2):
+    return TABLA_EVOLUCION[codigos_1, codigos_2]
 
 # ================================
-#  TABLAS RESUMEN
+#  PERÍODOS ACADÉMICOS
 # ================================
-riesgo_count_1 = df_becarios["RIESGO_2025_1"].value_counts().reset_index()
-riesgo_count_1.columns = ["NIVEL", "TOTAL"]
-riesgo_count_1["MOMENTO"] = "2025-1"
+# Cada columna de riesgo académico de la hoja corresponde a un período
+# (AAAA-S, p. ej. 2025-1). Se descubren desde los encabezados, cada uno se
+# clasifica una sola vez y la evolución se calcula para el par que se elija;
+# por defecto, los dos últimos períodos.
+_PATRON_PERIODO = re.compile(r"(?<!\d)(\d{4})-(\d)(?!\d)")
+_PATRON_COLUMNA_RIESGO = re.compile(r"^RIESGO_(\d{4})_(\d)$")
 
-riesgo_count_2 = df_becarios["RIESGO_2025_2"].value_counts().reset_index()
-riesgo_count_2.columns = ["NIVEL", "TOTAL"]
-riesgo_count_2["MOMENTO"] = "2025-2"
+def clave_periodo(periodo):
+    anio, semestre = periodo.split("-")
+    return int(anio), int(semestre)
 
-riesgo_resumen = pd.concat([riesgo_count_1, riesgo_count_2], ignore_index=True)
+def columnas_periodo(columnas):
+    """
+    {período: columna cruda de riesgo académico}, en orden cronológico. Por
+    período se toma la primera columna de riesgo que lo menciona (sin contar
+    las de riesgo psicológico); otras columnas con período, como "CICLO
+    INGRESO 2026-1", no cuentan
+    """
+    encontradas = {}
+    for col in columnas:
+        coincidencia = _PATRON_PERIODO.search(col)
+        if coincidencia and "RIESGO" in col.upper() and "PSICOL" not in col.upper():
+            encontradas.setdefault(f"{coincidencia[1]}-{coincidencia[2]}", col)
+    return {p: encontradas[p] for p in sorted(encontradas, key=clave_periodo)}
+
+def columna_riesgo(periodo):
+    """Columna derivada con los niveles de un período: 2025-1 -> RIESGO_2025_1"""
+    return "RIESGO_" + periodo.replace("-", "_")
+
+def periodos_becarios(df):
+    """Períodos con columna de riesgo derivada en df, en orden cronológico"""
+    periodos = [
+        f"{m[1]}-{m[2]}" for m in map(_PATRON_COLUMNA_RIESGO.match, df.columns) if m
+    ]
+    return sorted(periodos, key=clave_periodo)
+
+def periodos_posteriores(periodos, inicial):
+    """Los períodos que pueden ser el final de una comparación que empieza en inicial"""
+    return [p for p in periodos if inicial in periodos and clave_periodo(p) > clave_periodo(inicial)]
+
+def par_por_defecto(periodos):
+    return tuple(periodos[-2:])
+
+# Códigos ya calculados por período, con la huella de su columna cruda:
+# {período: (huella, códigos)}. Al refrescar, solo se clasifican los
+# períodos nuevos o cuya columna cambió
+_clasificaciones = {}
+
+def huella_columna(serie):
+    return hashlib.blake2b(
+        pd.util.hash_pandas_object(serie, index=False).to_numpy().tobytes(), digest_size=16
+    ).hexdigest()
+
+def clasificar_periodos(df, periodos):
+    """{período: códigos int8} de cada columna cruda, reutilizando los ya calculados"""
+    global _clasificaciones
+    nuevas = {}
+    for periodo, col in periodos.items():
+        huella = huella_columna(df[col])
+        anterior = _clasificaciones.get(periodo)
+        if anterior and anterior[0] == huella:
+            incrementar("becarios_periodos_clasificados_total", resultado="reutilizado")
+            nuevas[periodo] = anterior
+        else:
+            incrementar("becarios_periodos_clasificados_total", resultado="calculado")
+            nuevas[periodo] = (huella, clasificar_riesgo(df[col]))
+    _clasificaciones = nuevas
+    return {periodo: codigos for periodo, (_, codigos) in nuevas.items()}
 
 # ================================
-#  TABLA EN FORMATO ANCHO (NIVEL, 2025-1, 2025-2)
+#  MÉTRICAS (FORMATO PROMETHEUS)
 # ================================
-orden_niveles = ["ALTO", "MEDIO", "BAJO"]
+# Histogramas y contadores en memoria de este proceso, expuestos en /metrics.
+# Con varios workers de gunicorn cada uno lleva los suyos; Prometheus los
+# distingue por instancia y se suman al consultar.
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+AYUDA_METRICAS = {
+    "becarios_etapa_segundos": "Duración de cada etapa de carga y cálculo de datos",
+    "becarios_peticion_segundos": "Duración de las peticiones HTTP por ruta y callback de Dash",
+    "becarios_peticion_errores_total": "Peticiones HTTP que terminaron con error 5xx",
+    "becarios_refrescos_total": "Intentos de refresco de la fuente por resultado",
+    "becarios_periodos_clasificados_total": "Períodos de riesgo clasificados o reutilizados de la carga anterior",
+}
+
+_candado_metricas = threading.Lock()
+_histogramas = {}
+_contadores = {}
+
+def observar(nombre, segundos, **etiquetas):
+    clave = tuple(sorted(etiquetas.items()))
+    posicion = bisect.bisect_left(LIMITES_SEGUNDOS, segundos)
+    with _candado_metricas:
+        serie = _histogramas.setdefault(nombre, {}).setdefault(clave, [[0] * len(LIMITES_SEGUNDOS), 0.0, 0])
+        if posicion < len(LIMITES_SEGUNDOS):
+            serie[0][posicion] += 1
+        serie[1] += segundos
+        serie[2] += 1
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = tuple(sorted(etiquetas.items()))
+    with _candado_metricas:
+        series = _contadores.setdefault(nombre, {})
+        series[clave] = series.get(clave, 0) + valor
+
+@contextmanager
+def medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar("becarios_etapa_segundos", time.perf_counter() - inicio, etapa=etapa)
+
+def formato_etiquetas(pares):
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+def texto_metricas():
+    """Histogramas y contadores en el formato de texto de Prometheus"""
+    lineas = []
+    with _candado_metricas:
+        for nombre, series in _histogramas.items():
+            lineas += [f"# HELP {nombre} {AYUDA_METRICAS.get(nombre, nombre)}", f"# TYPE {nombre} histogram"]
+            for clave, (conteos, suma, total) in series.items():
+                acumulado = 0
+                for limite, conteo in zip(LIMITES_SEGUNDOS, conteos):
+                    acumulado += conteo
+                    lineas.append(f"{nombre}_bucket{formato_etiquetas(clave + (('le', limite),))} {acumulado}")
+                lineas.append(f"{nombre}_bucket{formato_etiquetas(clave + (('le', '+Inf'),))} {total}")
+                lineas.append(f"{nombre}_sum{formato_etiquetas(clave)} {suma}")
+                lineas.append(f"{nombre}_count{formato_etiquetas(clave)} {total}")
+        for nombre, series in _contadores.items():
+            lineas += [f"# HELP {nombre} {AYUDA_METRICAS.get(nombre, nombre)}", f"# TYPE {nombre} counter"]
+            for clave, valor in series.items():
+                lineas.append(f"{nombre}{formato_etiquetas(clave)} {valor}")
+    return lineas
+
+# ================================
+#  DESCARGA DE LA FUENTE (HTTP)
+# ================================
+# Una sesión con pool de conexiones por proceso, con timeouts y reintentos
+# con backoff. El cuerpo va directo a disco mientras se calcula su hash, y el
+# archivo queda en CACHE_DIR junto con su ETag / Last-Modified: si la fuente
+# no cambió, un refresco cuesta un solo 304.
+TIMEOUT_FUENTE = (10, 120)  # (conexión, lectura) en segundos
+BLOQUE_DESCARGA = 1 << 20
+
+_sesion = None
+_pid_sesion = None
+
+def sesion_http():
+    """Sesión del proceso; se rehace tras un fork para no compartir sockets con el maestro"""
+    global _sesion, _pid_sesion
+    if _sesion is None or _pid_sesion != os.getpid():
+        reintentos = Retry(
+            total=4, backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True
+        )
+        adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=reintentos)
+        sesion = requests.Session()
+        sesion.mount("http://", adaptador)
+        sesion.mount("https://", adaptador)
+        _sesion, _pid_sesion = sesion, os.getpid()
+    return _sesion
+
+def es_html(respuesta):
+    return "text/html" in respuesta.headers.get("Content-Type", "")
+
+def confirmacion_drive(respuesta):
+    """
+    Drive responde a los archivos grandes con una página de "no se pudo
+    analizar en busca de virus". Devuelve (url, parámetros) para confirmar la
+    descarga, o None si la respuesta no es esa página
+    """
+    for nombre, valor in respuesta.cookies.items():
+        if nombre.startswith("download_warning"):
+            return respuesta.url, {"confirm": valor}
+
+    pagina = respuesta.text
+    formulario = re.search(r'<form[^>]*id="download-form"[^>]*>(.*?)</form>', pagina, re.S)
+    if not formulario:
+        return None
+    accion = re.search(r'action="([^"]+)"', formulario.group(0))
+    parametros = {}
+    for campo in re.findall(r"<input[^>]*>", formulario.group(1)):
+        nombre = re.search(r'name="([^"]*)"', campo)
+        valor = re.search(r'value="([^"]*)"', campo)
+        if nombre:
+            parametros[unescape(nombre.group(1))] = unescape(valor.group(1)) if valor else ""
+    # El action puede ser relativo a la página de aviso
+    return urljoin(respuesta.url, unescape(accion.group(1))) if accion else respuesta.url, parametros
+
+def hash_archivo(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(BLOQUE_DESCARGA), b""):
+            digest.update(bloque)
+    return digest.hexdigest()[:16]
+
+def guardar_descarga(respuesta, base):
+    """Escribe el cuerpo en disco por bloques; devuelve (ruta, clave) con la clave = hash del contenido"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporal = f"{base}.{os.getpid()}.tmp"
+    digest = hashlib.sha256()
+    with open(temporal, "wb") as f:
+        for bloque in respuesta.iter_content(BLOQUE_DESCARGA):
+            digest.update(bloque)
+            f.write(bloque)
+
+    # El nombre lleva el hash: los metadatos siempre apuntan a un contenido fijo
+    clave = digest.hexdigest()[:16]
+    ruta = f"{base}_{clave}.xlsx"
+    os.replace(temporal, ruta)
+    limpiar_cache(f"{os.path.basename(base)}_", ".xlsx", conservar=ruta)
+    return ruta, clave
+
+def leer_metadatos(ruta):
+    try:
+        with open(ruta) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def guardar_metadatos(ruta, metadatos):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w") as f:
+        json.dump(metadatos, f)
+    os.replace(temporal, ruta)
+
+def descargar_fuente(url):
+    """
+    Devuelve (ruta, clave): un archivo local con el contenido de la fuente y
+    el hash de ese contenido. También acepta una ruta local (p. ej. un libro
+    sintético del benchmark)
+    """
+    if os.path.isfile(url):
+        return url, hash_archivo(url)
+
+    base = os.path.join(CACHE_DIR, f"fuente_{hashlib.sha256(url.encode()).hexdigest()[:12]}")
+    metadatos = leer_metadatos(f"{base}.json")
+    condiciones = {}
+    if metadatos and os.path.exists(metadatos["archivo"]):
+        if metadatos.get("etag"):
+            condiciones["If-None-Match"] = metadatos["etag"]
+        if metadatos.get("last_modified"):
+            condiciones["If-Modified-Since"] = metadatos["last_modified"]
+
+    sesion = sesion_http()
+    respuesta = sesion.get(url, headers=condiciones, stream=True, timeout=TIMEOUT_FUENTE)
+    try:
+        if respuesta.status_code == 304:
+            return metadatos["archivo"], metadatos["clave"]
+        respuesta.raise_for_status()
+
+        if es_html(respuesta):
+            confirmacion = confirmacion_drive(respuesta)
+            if confirmacion is None:
+                raise ValueError(
+                    "La fuente devolvió una página HTML en lugar del Excel "
+                    "(¿el archivo no es público o el ID es incorrecto?)"
+                )
+            respuesta.close()
+            destino, parametros = confirmacion
+            respuesta = sesion.get(destino, params=parametros, headers=condiciones, stream=True, timeout=TIMEOUT_FUENTE)
+            if respuesta.status_code == 304:
+                return metadatos["archivo"], metadatos["clave"]
+            respuesta.raise_for_status()
+            if es_html(respuesta):
+                raise ValueError("Drive no entregó el archivo después de confirmar la descarga")
+
+        ruta, clave = guardar_descarga(respuesta, base)
+        guardar_metadatos(f"{base}.json", {
+            "url": url,
+            "etag": respuesta.headers.get("ETag"),
+            "last_modified": respuesta.headers.get("Last-Modified"),
+            "archivo": ruta,
+            "clave": clave,
+        })
+        return ruta, clave
+    finally:
+        respuesta.close()
+
+# ================================
+#  CACHE LOCAL (PARQUET)
+# ================================
+# Directorio donde se guarda df_becarios ya normalizado, para no volver a
+# parsear el xlsx en cada arranque si la fuente no ha cambiado.
+CACHE_DIR = os.environ.get(
+    "BECARIOS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_becarios")
+)
+# Incrementar si cambia la limpieza o las columnas derivadas
+VERSION_CACHE = "4"
+
+# ================================
+#  LECTURA DEL XLSX (PROYECCIÓN DE COLUMNAS)
+# ================================
+# El dashboard solo usa unas pocas columnas: se resuelven desde la fila de
+# encabezados y solo esas se parsean. Las exportaciones necesitan las filas
+# completas y las leen aparte, bajo demanda (ver ruta_completo).
+COLUMNAS_DASHBOARD = ["APELLIDOS Y NOMBRES", "MODALIDAD", "TIPO DE BENEFICIO"]
+
+# Los lectores (leer_hoja_openpyxl, leer_hoja_pandas y LECTORES_EXCEL por
+# motor) están en lector_hojas.py, que también corre como proceso aparte
+
+def motor_excel():
+    """BECARIOS_MOTOR_EXCEL, o calamine si está instalado, o openpyxl en modo read_only"""
+    motor = os.environ.get("BECARIOS_MOTOR_EXCEL", "").strip().lower()
+    if motor:
+        if motor not in LECTORES_EXCEL:
+            raise ValueError(f"BECARIOS_MOTOR_EXCEL desconocido: {motor} (opciones: {', '.join(LECTORES_EXCEL)})")
+        return motor
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+MOTOR_EXCEL = motor_excel()
+
+def columnas_necesarias(encabezados):
+    """Posiciones de las columnas que usa el dashboard, según la fila de encabezados"""
+    nombres = list(normalizar_nombres(pd.Index(encabezados).astype(str)))
+    necesarias = set(COLUMNAS_DASHBOARD) | set(columnas_periodo(nombres).values()) | {CLAVE_BECARIO}
+    col_psicologico = columna_psicologico(nombres)
+    if col_psicologico:
+        necesarias.add(col_psicologico)
+    return [i for i, nombre in enumerate(nombres) if nombre in necesarias]
+
+def leer_becarios(ruta, completo=False):
+    if completo:
+        # Para exportar se respeta la inferencia de tipos de read_excel
+        df = leer_hoja_pandas(ruta, "BECARIOS", motor="calamine" if MOTOR_EXCEL == "calamine" else "openpyxl")
+    else:
+        df = LECTORES_EXCEL[MOTOR_EXCEL](ruta, "BECARIOS", columnas_necesarias)
+    df = normalizar_columnas(df)
+    return normalizar_tipos(df)
+
+def normalizar_tipos(df):
+    """
+    Convierte a texto las columnas con tipos mezclados (p. ej. números y
+    textos en la misma columna) para que el DataFrame se pueda guardar en Parquet
+    """
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        no_nulos = df[col].dropna()
+        if no_nulos.map(type).nunique() > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def categorica(codigos, niveles, ordenada=False):
+    return pd.Categorical.from_codes(codigos, categories=list(niveles), ordered=ordenada)
+
+def clasificar_becarios(df):
+    # Normalizar columnas de riesgo, una por período
+    periodos = columnas_periodo(df.columns)
+    if len(periodos) < 2:
+        raise ValueError(
+            f"Se necesitan al menos dos columnas de riesgo por período (AAAA-S); encontradas: {list(periodos.values())}"
+        )
+    col_psicologico = columna_psicologico(df.columns)
+
+    codigos = clasificar_periodos(df, periodos)
+    for periodo in periodos:
+        df[columna_riesgo(periodo)] = categorica(codigos[periodo], NIVELES_RIESGO, ordenada=True)
+
+    # Evolución entre los dos últimos períodos (la de la tabla y las exportaciones)
+    par = par_por_defecto(list(periodos))
+    df["EVOLUCION"] = categorica(calcular_evolucion(codigos[par[0]], codigos[par[1]]), etiquetas_evolucion(par))
+
+    if col_psicologico:
+        df["RIESGO_PSICOLOGICO"] = categorica(
+            clasificar_riesgo(df[col_psicologico]), NIVELES_PSICOLOGICO, ordenada=True
+        )
+    return compactar_becarios(df, list(periodos.values()) + [col_psicologico])
+
+def procesar_becarios(ruta):
+    with medir("lectura_excel"):
+        df, auxiliares = leer_libro(ruta)
+    with medir("clasificacion"):
+        df = clasificar_becarios(df)
+    with medir("union_hojas"):
+        return unir_auxiliares(df, auxiliares)
+
+def clave_datos(version):
+    """
+    Clave de los archivos de cache y exportación de una versión de la fuente,
+    y ETag de sus descargas. Las hojas unidas forman parte del resultado:
+    otra configuración, otra clave
+    """
+    clave = f"v{VERSION_CACHE}_{version}"
+    if HOJAS_AUXILIARES:
+        firma = hashlib.sha1(json.dumps([HOJAS_AUXILIARES, CLAVE_BECARIO]).encode()).hexdigest()[:8]
+        clave = f"{clave}_{firma}"
+    return clave
+
+def ruta_cache(clave):
+    return os.path.join(CACHE_DIR, f"becarios_{clave_datos(clave)}.parquet")
+
+def guardar_cache(df, ruta):
+    """
+    Escribe el Parquet en un archivo temporal y lo renombra, para que otro
+    proceso nunca lea un archivo a medio escribir
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    df.to_parquet(temporal, index=False)
+    os.replace(temporal, ruta)
+
+    limpiar_cache("becarios_", ".parquet", conservar=ruta)
+
+def limpiar_cache(prefijo, extension, conservar):
+    """Elimina versiones anteriores de un archivo de la cache (conservar: una ruta o varias)"""
+    conservar = {conservar} if isinstance(conservar, str) else set(conservar)
+    for nombre in os.listdir(CACHE_DIR):
+        anterior = os.path.join(CACHE_DIR, nombre)
+        if nombre.startswith(prefijo) and nombre.endswith(extension) and anterior not in conservar:
+            try:
+                os.remove(anterior)
+            except OSError:
+                pass
+
+def cargar_becarios(url, version_actual=None):
+    """
+    Devuelve (df_becarios, version, ruta_fuente). Si la fuente no cambió
+    respecto a version_actual, devuelve (None, version, ruta_fuente) sin
+    leer nada más
+    """
+    with medir("descarga"):
+        ruta_fuente, clave = descargar_fuente(url)
+    if clave == version_actual:
+        return None, clave, ruta_fuente
+
+    ruta = ruta_cache(clave)
+    if os.path.exists(ruta):
+        try:
+            with medir("lectura_cache"):
+                return pd.read_parquet(ruta), clave, ruta_fuente
+        except Exception as e:
+            print(f"Cache de becarios inválida, se vuelve a procesar: {e}")
+
+    df = procesar_becarios(ruta_fuente)
+    try:
+        guardar_cache(df, ruta)
+    except Exception as e:
+        print(f"No se pudo guardar la cache de becarios: {e}")
+    return df, clave, ruta_fuente
+
+# ================================
+#  HOJAS AUXILIARES (LECTURA EN PARALELO Y UNIÓN POR CLAVE)
+# ================================
+# Además de BECARIOS, el libro puede traer hojas con datos por becario
+# (encuestas, asistencia a tutorías...). Cada hoja auxiliar se parsea en su
+# propio proceso (lector_hojas.py) mientras este proceso parsea BECARIOS:
+# con openpyxl el parseo es Python puro y en hilos no avanzaría en paralelo.
+# Con una sola CPU (o BECARIOS_PROCESOS_LECTURA=1) se leen aquí, una tras
+# otra. Cada hoja auxiliar arma su índice hash por clave de becario, así la
+# unión es un get_indexer por hoja. Sus columnas llegan a df_becarios como
+# "HOJA: COLUMNA".
+HOJA_BECARIOS = "BECARIOS"
+HOJAS_AUXILIARES = [h.strip() for h in os.environ.get("BECARIOS_HOJAS_AUXILIARES", "").split(",") if h.strip()]
+CLAVE_BECARIO = normalizar_nombres(pd.Index([os.environ.get("BECARIOS_CLAVE", "APELLIDOS Y NOMBRES")]))[0]
+# Procesos que parsean a la vez, contando este
+PROCESOS_LECTURA = int(os.environ.get("BECARIOS_PROCESOS_LECTURA", str(os.cpu_count() or 1)))
+SCRIPT_LECTOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lector_hojas.py")
+
+def hojas_libro(ruta):
+    """Nombres de las hojas, desde xl/workbook.xml y sin cargar el libro"""
+    with zipfile.ZipFile(ruta) as libro:
+        raiz = ElementTree.fromstring(libro.read("xl/workbook.xml"))
+    return [hoja.get("name") for hoja in raiz.iter() if hoja.tag.endswith("}sheet")]
+
+def claves_becario(serie):
+    """
+    Clave comparable entre hojas: texto sin tildes, en mayúsculas y sin
+    espacios de más (un DNI leído como 123.0 queda "123"). Vacía -> None
+    """
+    if pd.api.types.is_float_dtype(serie.dtype) and (serie.dropna() % 1 == 0).all():
+        serie = serie.astype("Int64")
+    codigos, unicos = pd.factorize(serie)
+    normalizadas = np.array([normalizar_texto(v) or None for v in unicos] + [None], dtype=object)
+    return normalizadas[codigos]
+
+def leer_hoja_aparte(ruta, hoja):
+    """La hoja completa, parseada por lector_hojas.py en otro proceso de Python"""
+    with tempfile.TemporaryDirectory(prefix="hoja_") as directorio:
+        destino = os.path.join(directorio, "hoja.pkl")
+        proceso = subprocess.run(
+            [sys.executable, SCRIPT_LECTOR, ruta, hoja, MOTOR_EXCEL, destino],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        if proceso.returncode != 0:
+            detalle = proceso.stderr.strip().splitlines()[-1:] or [f"código {proceso.returncode}"]
+            raise RuntimeError(f"No se pudo leer la hoja {hoja}: {detalle[0]}")
+        return pd.read_pickle(destino)
+
+def preparar_auxiliar(df, hoja):
+    """(columnas de la hoja, índice hash de sus claves), o None si la hoja no trae la clave"""
+    df = normalizar_tipos(normalizar_columnas(df))
+    if CLAVE_BECARIO not in df.columns:
+        print(f"La hoja {hoja} no tiene la columna {CLAVE_BECARIO}: no se une")
+        return None
+
+    claves = pd.Series(claves_becario(df[CLAVE_BECARIO]))
+    validas = (claves.notna() & ~claves.duplicated()).to_numpy()
+    if (claves.notna() & claves.duplicated()).any():
+        print(f"La hoja {hoja} repite claves de becario: se usa la primera fila de cada una")
+    columnas = df.loc[validas, [c for c in df.columns if c != CLAVE_BECARIO]].reset_index(drop=True)
+    columnas.columns = [f"{hoja.upper()}: {c}" for c in columnas.columns]
+    return columnas, pd.Index(claves[validas])
+
+def leer_libro(ruta):
+    """
+    (df de BECARIOS proyectado, {hoja: (columnas, índice)} de las hojas
+    auxiliares). Sin hojas auxiliares es lo mismo que leer_becarios
+    """
+    if not HOJAS_AUXILIARES:
+        return leer_becarios(ruta), {}
+
+    disponibles = hojas_libro(ruta)
+    faltantes = [h for h in HOJAS_AUXILIARES if h not in disponibles]
+    if faltantes:
+        print(f"Hojas auxiliares que no están en el libro: {', '.join(faltantes)}")
+    auxiliares = [h for h in HOJAS_AUXILIARES if h in disponibles]
+
+    if PROCESOS_LECTURA > 1 and auxiliares:
+        # Los hilos solo esperan a los procesos; BECARIOS se parsea aquí mientras tanto
+        with ThreadPoolExecutor(max_workers=min(PROCESOS_LECTURA - 1, len(auxiliares))) as hilos:
+            futuros = {hoja: hilos.submit(leer_hoja_aparte, ruta, hoja) for hoja in auxiliares}
+            df = leer_becarios(ruta)
+            crudas = {hoja: futuro.result() for hoja, futuro in futuros.items()}
+    else:
+        df = leer_becarios(ruta)
+        crudas = {hoja: LECTORES_EXCEL[MOTOR_EXCEL](ruta, hoja) for hoja in auxiliares}
+
+    tablas = {hoja: preparar_auxiliar(cruda, hoja) for hoja, cruda in crudas.items()}
+    return df, {hoja: tabla for hoja, tabla in tablas.items() if tabla is not None}
+
+def unir_auxiliares(df, tablas):
+    """Agrega a df las columnas de cada hoja auxiliar, vacías para los becarios sin fila en ella"""
+    if not tablas:
+        return df
+    if CLAVE_BECARIO not in df.columns:
+        print(f"BECARIOS no tiene la columna {CLAVE_BECARIO}: no se unen las hojas auxiliares")
+        return df
+
+    claves = claves_becario(df[CLAVE_BECARIO])
+    for hoja, (columnas, indice) in tablas.items():
+        posiciones = indice.get_indexer(claves)
+        print(f"Hoja {hoja}: {int((posiciones >= 0).sum())} de {len(df)} becarios unidos")
+        unidas = columnas.reindex(posiciones)
+        unidas.index = df.index
+        df = pd.concat([df, unidas], axis=1)
+    return df
 
-tabla_resumen = riesgo_resumen.pivot_table(
-    index="NIVEL", columns="MOMENTO", values="TOTAL", fill_value=0
-).reset_index()
+def columnas_auxiliares(df):
+    prefijos = tuple(f"{hoja.upper()}: " for hoja in HOJAS_AUXILIARES)
+    return [c for c in df.columns if prefijos and c.startswith(prefijos)]
 
-# Quitar NO ENCONTRADO y ordenar
-tabla_resumen = tabla_resumen[tabla_resumen["NIVEL"].isin(orden_niveles)]
-tabla_resumen["NIVEL"] = pd.Categorical(tabla_resumen["NIVEL"], categories=orden_niveles, ordered=True)
-tabla_resumen = tabla_resumen.sort_values("NIVEL")
+# ================================
+#  REPRESENTACIÓN COMPACTA EN MEMORIA
+# ================================
+# Las columnas con pocos valores distintos se guardan como categóricas (un
+# código int8 por fila en vez de un string) y las columnas crudas de riesgo
+# se descartan una vez clasificadas: el dashboard solo usa las derivadas y
+# las exportaciones leen las filas completas aparte (ver ruta_completo).
+COLUMNAS_CATEGORICAS = ["MODALIDAD", "TIPO DE BENEFICIO"]
+
+def compactar_becarios(df, columnas_crudas):
+    df = df.drop(columns=[c for c in columnas_crudas if c], errors="ignore")
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+def reporte_memoria(df):
+    """Bytes por columna: como texto object (representación anterior) y como está ahora"""
+    filas = []
+    for col in df.columns:
+        serie = df[col]
+        ahora = int(serie.memory_usage(deep=True, index=False))
+        antes = int(serie.astype(object).memory_usage(deep=True, index=False)) if isinstance(serie.dtype, pd.CategoricalDtype) else ahora
+        filas.append((col, str(serie.dtype), antes, ahora))
+    reporte = pd.DataFrame(filas, columns=["COLUMNA", "TIPO", "BYTES_ANTES", "BYTES_AHORA"])
+    total = pd.DataFrame([("TOTAL", "", reporte["BYTES_ANTES"].sum(), reporte["BYTES_AHORA"].sum())], columns=reporte.columns)
+    return pd.concat([reporte, total], ignore_index=True)
+
+# ================================
+#  CUBO DE CONTEOS
+# ================================
+# Conteo de becarios por cada combinación de MODALIDAD, riesgo del período
+# inicial, riesgo del período final, evolución y riesgo psicológico. Se arma
+# una vez por snapshot y por par de períodos, y todas las tablas, KPIs y
+# gráficos salen de aquí sumando la columna N, así su costo no depende del
+# número de filas de la base.
+DIMENSIONES_CUBO = [
+    "MODALIDAD", "TIPO DE BENEFICIO", "RIESGO_INICIAL", "RIESGO_FINAL", "EVOLUCION", "RIESGO_PSICOLOGICO"
+]
+
+def columna_psicologico(columnas):
+    """
+    Busca la columna de riesgo psicológico (None si no existe); si hay
+    varias, la del período más reciente
+    """
+    candidatas = [col for col in columnas if "RIESGO PSICOLÓGICO" in col.upper()]
+    if not candidatas:
+        return None
+    con_periodo = [col for col in candidatas if _PATRON_PERIODO.search(col)]
+    if not con_periodo:
+        return candidatas[0]
+    return max(con_periodo, key=lambda col: clave_periodo(_PATRON_PERIODO.search(col)[0]))
+
+def construir_cubo(df, par):
+    sin_dato = pd.Series(None, index=df.index, dtype=object)
+    inicial, final = (df[columna_riesgo(periodo)] for periodo in par)
+    evolucion = categorica(
+        calcular_evolucion(inicial.cat.codes.to_numpy(), final.cat.codes.to_numpy()), etiquetas_evolucion(par)
+    )
+
+    dimensiones = pd.DataFrame({
+        "MODALIDAD": df["MODALIDAD"] if "MODALIDAD" in df.columns else sin_dato,
+        "TIPO DE BENEFICIO": df["TIPO DE BENEFICIO"] if "TIPO DE BENEFICIO" in df.columns else sin_dato,
+        "RIESGO_INICIAL": inicial,
+        "RIESGO_FINAL": final,
+        "EVOLUCION": pd.Series(evolucion, index=df.index),
+        "RIESGO_PSICOLOGICO": df["RIESGO_PSICOLOGICO"] if "RIESGO_PSICOLOGICO" in df.columns else sin_dato,
+    })
+    cubo = (
+        dimensiones.groupby(DIMENSIONES_CUBO, dropna=False, observed=True)
+        .size()
+        .reset_index(name="N")
+    )
+    # El agrupado se hace sobre los códigos; el cubo (pocas filas) queda en
+    # texto y en orden alfabético, como lo esperan tablas y gráficos
+    for col in DIMENSIONES_CUBO:
+        cubo[col] = cubo[col].astype(object)
+    return cubo.sort_values(DIMENSIONES_CUBO, na_position="last", ignore_index=True)
+
+def mascara_se_mantuvieron(df, inicial="RIESGO_INICIAL", final="RIESGO_FINAL"):
+    """Se mantuvieron con datos en ambos períodos (sirve para filas o para el cubo)"""
+    return (
+        (df["EVOLUCION"] == "SE MANTUVO") &
+        (df[inicial] != "NO ENCONTRADO") &
+        (df[final] != "NO ENCONTRADO")
+    )
+
+def contar(cubo, mascara=None):
+    return int(cubo["N"].sum() if mascara is None else cubo.loc[mascara, "N"].sum())
+
+# Sin filtros: (modalidades, tipos de beneficio, evoluciones)
+SIN_FILTROS = ((), (), ())
+
+def normalizar_filtros(modalidades, beneficios, evoluciones):
+    """Tupla ordenada y hashable de los filtros, para usarla como clave de cache"""
+    return tuple(tuple(sorted(valores or [], key=str)) for valores in (modalidades, beneficios, evoluciones))
+
+def filtrar_cubo(cubo, filtros):
+    modalidades, beneficios, evoluciones = filtros
+    mascara = pd.Series(True, index=cubo.index)
+    if modalidades:
+        mascara &= cubo["MODALIDAD"].isin(modalidades)
+    if beneficios:
+        mascara &= cubo["TIPO DE BENEFICIO"].isin(beneficios)
+    if evoluciones:
+        mascara &= cubo["EVOLUCION"].isin(evoluciones)
+    return cubo[mascara]
 
 # ================================
-#  SEPARAR NO ENCONTRADOS
+#  TABLAS RESUMEN
 # ================================
-riesgo_validos = riesgo_resumen[riesgo_resumen["NIVEL"].isin(orden_niveles)]
-riesgo_no_encontrado = riesgo_resumen[riesgo_resumen["NIVEL"] == "NO ENCONTRADO"]
+orden_niveles = ["ALTO", "MEDIO", "BAJO"]
+
+def leer_totales_periodo(texto):
+    """'2025-1=3169,2025-2=3300' -> {"2025-1": 3169, "2025-2": 3300}"""
+    totales = {}
+    for par in filter(None, (p.strip() for p in texto.split(","))):
+        periodo, _, total = par.partition("=")
+        totales[periodo.strip()] = int(total)
+    return totales
+
+# Total oficial de becarios de los períodos cuya base no los incluye a todos
+# (BECARIOS_TOTALES_PERIODO); los demás períodos usan el conteo de la base
+TOTALES_PERIODO = leer_totales_periodo(os.environ.get("BECARIOS_TOTALES_PERIODO", "2025-1=3169"))
+
+def total_periodo(periodo, cubo):
+    return TOTALES_PERIODO.get(periodo, contar(cubo))
+
+def calcular_resumen(cubo, par):
+    riesgo_count_1 = cubo.groupby("RIESGO_INICIAL")["N"].sum().sort_values(ascending=False).reset_index()
+    riesgo_count_1.columns = ["NIVEL", "TOTAL"]
+    riesgo_count_1["MOMENTO"] = par[0]
+
+    riesgo_count_2 = cubo.groupby("RIESGO_FINAL")["N"].sum().sort_values(ascending=False).reset_index()
+    riesgo_count_2.columns = ["NIVEL", "TOTAL"]
+    riesgo_count_2["MOMENTO"] = par[1]
+
+    riesgo_resumen = pd.concat([riesgo_count_1, riesgo_count_2], ignore_index=True)
+
+    # Tabla en formato ancho (NIVEL, período inicial, período final)
+    tabla_resumen = riesgo_resumen.pivot_table(
+        index="NIVEL", columns="MOMENTO", values="TOTAL", fill_value=0
+    ).reset_index()
+
+    # Quitar NO ENCONTRADO y ordenar
+    tabla_resumen = tabla_resumen[tabla_resumen["NIVEL"].isin(orden_niveles)]
+    tabla_resumen["NIVEL"] = pd.Categorical(tabla_resumen["NIVEL"], categories=orden_niveles, ordered=True)
+    tabla_resumen = tabla_resumen.sort_values("NIVEL")
+
+    # Separar no encontrados
+    riesgo_validos = riesgo_resumen[riesgo_resumen["NIVEL"].isin(orden_niveles)]
+    riesgo_no_encontrado = riesgo_resumen[riesgo_resumen["NIVEL"] == "NO ENCONTRADO"]
+
+    return riesgo_resumen, tabla_resumen, riesgo_validos, riesgo_no_encontrado
 
 # ================================
 #  INDICADORES (KPIs)
 # ================================
-total_becarios = len(df_becarios)
-mejoraron = (df_becarios["EVOLUCION"] == "MEJORO").sum()
-empeoraron = (df_becarios["EVOLUCION"] == "EMPEORO").sum()
+def calcular_kpis(cubo):
+    total_becarios = contar(cubo)
+    mejoraron = contar(cubo, cubo["EVOLUCION"] == "MEJORO")
+    empeoraron = contar(cubo, cubo["EVOLUCION"] == "EMPEORO")
+    se_mantuvieron = contar(cubo, mascara_se_mantuvieron(cubo))
+
+    return total_becarios, mejoraron, empeoraron, se_mantuvieron
+
+# ================================
+#  MATRIZ DE TRANSICIÓN DE RIESGO
+# ================================
+# Cuántos becarios pasaron de cada nivel del período inicial a cada nivel
+# del final, NO ENCONTRADO incluido. Se cuenta en una sola pasada sobre los
+# códigos de las columnas categóricas (sin agrupar textos) y se guarda por
+# snapshot y par de períodos.
+# Orden en que se muestran los niveles: ALTO, MEDIO, BAJO, NO ENCONTRADO
+ORDEN_TRANSICION = [3, 2, 1, 0]
+
+def matriz_transicion(df, par):
+    """Conteos [código inicial, código final] (4x4) entre los niveles de dos períodos"""
+    n = len(NIVELES_RIESGO)
+    inicial, final = (df[columna_riesgo(periodo)].cat.codes.to_numpy(np.intp) for periodo in par)
+    return np.bincount(inicial * n + final, minlength=n * n).reshape(n, n)
 
-se_mantuvieron = df_becarios[
-    (df_becarios["EVOLUCION"] == "SE MANTUVO") &
-    (df_becarios["RIESGO_2025_1"] != "NO ENCONTRADO") &
-    (df_becarios["RIESGO_2025_2"] != "NO ENCONTRADO")
-].shape[0]
+def tabla_transicion(matriz, par):
+    """Matriz en filas (nivel inicial) y columnas (nivel final), con totales"""
+    niveles = list(NIVELES_RIESGO[ORDEN_TRANSICION])
+    conteos = matriz[np.ix_(ORDEN_TRANSICION, ORDEN_TRANSICION)]
+    tabla = pd.DataFrame(conteos, columns=niveles)
+    tabla.insert(0, f"{par[0]} \\ {par[1]}", niveles)
+    tabla["TOTAL"] = conteos.sum(axis=1)
+    return tabla
 
 # ================================
 #  DASHBOARD
 # ================================
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# El contenido principal llega después del primer render si los datos aún se
+# están cargando, así que sus componentes no siempre están en el layout inicial
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 app.title = "Dashboard Riesgo Academico 2025"
 
+NOMBRE_EXCEL = "analisis_completo_becarios_2025.xlsx"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 # Paleta de colores profesional
 COLORS = {
     'primary': '#2E86AB',      # Azul elegante
@@ -143,46 +900,53 @@ COLORS = {
 }
 
 def tarjeta_moderna(titulo, valor, color_hex, icono="", descripcion=""):
+    # El resto del estilo está en las clases tarjeta-kpi* (assets/estilos.css)
     return dbc.Card([
         dbc.CardBody([
             html.Div([
                 html.Div([
-                    html.I(className=f"fas fa-{icono}", style={
-                        'fontSize': '2.5rem', 
-                        'color': color_hex,
-                        'marginBottom': '10px'
-                    }),
+                    html.I(className=f"fas fa-{icono} tarjeta-kpi-icono", style={'color': color_hex}),
                 ], className="text-center"),
-                html.H3(valor, className="card-title text-center", style={
-                    'color': color_hex, 
-                    'fontWeight': 'bold',
-                    'fontSize': '2.2rem',
-                    'marginBottom': '5px'
-                }),
-                html.H6(titulo, className="card-subtitle text-center", style={
-                    'color': '#666',
-                    'fontWeight': '500',
-                    'fontSize': '0.9rem'
-                }),
-                html.P(descripcion, className="card-text text-center", style={
-                    'color': '#888',
-                    'fontSize': '0.8rem',
-                    'marginTop': '8px',
-                    'marginBottom': '0'
-                })
+                html.H3(valor, className="card-title text-center tarjeta-kpi-valor", style={'color': color_hex}),
+                html.H6(titulo, className="card-subtitle text-center tarjeta-kpi-titulo"),
+                html.P(descripcion, className="card-text text-center tarjeta-kpi-descripcion")
             ])
-        ], style={'padding': '20px'})
-    ], style={
-        'border': 'none',
-        'borderRadius': '15px',
-        'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-        'background': 'linear-gradient(135deg, #ffffff 0%, #f8f9fa 100%)',
-        'transition': 'transform 0.3s ease',
-        'margin': '10px 5px',
-        'height': '180px'
-    }, className="h-100 hover-card")
-
-def grafico_riesgo():
+        ])
+    ], className="h-100 hover-card tarjeta-kpi")
+
+def tarjetas_kpi(total_becarios, mejoraron, empeoraron, se_mantuvieron):
+    return [
+        dbc.Col(tarjeta_moderna(
+            "Total de Becarios", 
+            total_becarios, 
+            COLORS['primary'], 
+            "users",
+            "Población total"
+        ), lg=3, md=6, sm=12),
+        dbc.Col(tarjeta_moderna(
+            "Mejoraron", 
+            mejoraron, 
+            COLORS['success'], 
+            "arrow-up",
+            "Evolución positiva"
+        ), lg=3, md=6, sm=12),
+        dbc.Col(tarjeta_moderna(
+            "Empeoraron", 
+            empeoraron, 
+            COLORS['danger'], 
+            "arrow-down",
+            "Evolución negativa"
+        ), lg=3, md=6, sm=12),
+        dbc.Col(tarjeta_moderna(
+            "Se Mantuvieron", 
+            se_mantuvieron, 
+            COLORS['secondary'], 
+            "minus",
+            "Sin cambios"
+        ), lg=3, md=6, sm=12),
+    ]
+
+def grafico_riesgo(riesgo_validos, par):
     fig = px.bar(
         riesgo_validos,
         x="NIVEL",
@@ -192,8 +956,8 @@ def grafico_riesgo():
         text="TOTAL",
         category_orders={"NIVEL": orden_niveles},
         color_discrete_map={
-            "2025-1": COLORS['info'],
-            "2025-2": COLORS['primary']
+            par[0]: COLORS['info'],
+            par[1]: COLORS['primary']
         }
     )
     fig.update_traces(textposition="outside")
@@ -224,29 +988,26 @@ def grafico_riesgo():
     fig.update_yaxes(showgrid=True, gridcolor='rgba(128,128,128,0.1)')
     return fig
 
-def grafico_no_encontrado():
+def grafico_no_encontrado(cubo, par):
     """
     Gráfico de barras agrupadas mostrando becarios con/sin datos de riesgo
     """
     
     # Obtener datos
-    no_encontrados_2025_1 = (df_becarios["RIESGO_2025_1"] == "NO ENCONTRADO").sum()
-    no_encontrados_2025_2 = (df_becarios["RIESGO_2025_2"] == "NO ENCONTRADO").sum()
-    
-    # Total de becarios por período
-    total_2025_1 = 3169  # Dato proporcionado
-    total_2025_2 = len(df_becarios)  # Conteo actual del DataFrame
+    sin_datos = [
+        contar(cubo, cubo["RIESGO_INICIAL"] == "NO ENCONTRADO"),
+        contar(cubo, cubo["RIESGO_FINAL"] == "NO ENCONTRADO"),
+    ]
     
-    # Calcular "ENCONTRADOS" (becarios con datos de riesgo)
-    encontrados_2025_1 = total_2025_1 - no_encontrados_2025_1
-    encontrados_2025_2 = total_2025_2 - no_encontrados_2025_2
+    # Total de becarios por período: el informado en TOTALES_PERIODO o el conteo actual de la base
+    totales = [total_periodo(periodo, cubo) for periodo in par]
     
     # Crear DataFrame para barras agrupadas
     datos_agrupados = pd.DataFrame({
-        'PERIODO': ['2025-1', '2025-2'],
-        'BECARIOS': [total_2025_1, total_2025_2],  # Mostrar el total completo
-        'NO ENCONTRADOS': [no_encontrados_2025_1, no_encontrados_2025_2],
-        'TOTAL': [total_2025_1, total_2025_2]
+        'PERIODO': list(par),
+        'BECARIOS': totales,  # Mostrar el total completo
+        'NO ENCONTRADOS': sin_datos,
+        'TOTAL': totales
     })
     
     # Crear gráfico de barras agrupadas
@@ -294,7 +1055,7 @@ def grafico_no_encontrado():
     )
     
     # Agregar totales y porcentajes encima de cada grupo de barras
-    for i, periodo in enumerate(['2025-1', '2025-2']):
+    for i, periodo in enumerate(par):
         total = datos_agrupados.iloc[i]['TOTAL']
         no_encontrados = datos_agrupados.iloc[i]['NO ENCONTRADOS']
         porcentaje = (no_encontrados / total * 100) if total > 0 else 0
@@ -302,7 +1063,7 @@ def grafico_no_encontrado():
         # Porcentaje sin datos (ya no necesitamos mostrar el total porque está en la barra azul)
         fig.add_annotation(
             x=periodo,
-            y=max(total_2025_1, total_2025_2, no_encontrados_2025_1, no_encontrados_2025_2) + 150,
+            y=max(totales + sin_datos) + 150,
             text=f"<b>{porcentaje:.1f}%</b> sin datos de riesgo académico",
             showarrow=False,
             font=dict(size=12, color=COLORS['danger']),
@@ -313,8 +1074,8 @@ def grafico_no_encontrado():
     fig.update_xaxes(
         showgrid=False,
         tickmode='array',
-        tickvals=['2025-1', '2025-2'],
-        ticktext=['2025-1', '2025-2']
+        tickvals=list(par),
+        ticktext=list(par)
     )
     fig.update_yaxes(showgrid=True, gridcolor='rgba(128,128,128,0.1)')
     
@@ -323,8 +1084,8 @@ def grafico_no_encontrado():
 # ================================
 #  GRÁFICO: EMPEORARON POR MODALIDAD (MEJORADO)
 # ================================
-def grafico_empeoraron_por_modalidad():
-    df_empeoraron = df_becarios[df_becarios["EVOLUCION"] == "EMPEORO"]
+def grafico_empeoraron_por_modalidad(cubo, hay_modalidad=True):
+    df_empeoraron = cubo[cubo["EVOLUCION"] == "EMPEORO"]
 
     if df_empeoraron.empty:
         fig = go.Figure()
@@ -341,7 +1102,7 @@ def grafico_empeoraron_por_modalidad():
         return fig
 
     # Verificar si existe la columna MODALIDAD
-    if "MODALIDAD" not in df_empeoraron.columns:
+    if not hay_modalidad:
         fig = go.Figure()
         fig.add_annotation(
             text="Columna 'MODALIDAD' no encontrada en los datos",
@@ -355,8 +1116,8 @@ def grafico_empeoraron_por_modalidad():
         )
         return fig
 
-    # Crear una copia del DataFrame para modificar
-    df_temp = df_empeoraron.copy()
+    # Crear una copia de las combinaciones para modificar
+    df_temp = df_empeoraron[["MODALIDAD", "N"]].copy()
     
     # UNIFICAR MODALIDADES CNA
     df_temp["MODALIDAD"] = df_temp["MODALIDAD"].replace({
@@ -370,8 +1131,8 @@ def grafico_empeoraron_por_modalidad():
 
     # Agrupar por modalidad
     empeoraron_por_modalidad = (
-        df_temp.groupby("MODALIDAD")
-        .size()
+        df_temp.groupby("MODALIDAD")["N"]
+        .sum()
         .reset_index(name="TOTAL")
         .sort_values("TOTAL", ascending=False)
     )
@@ -551,13 +1312,13 @@ def grafico_empeoraron_por_modalidad():
     
     return fig
 
-def grafico_torta_riesgo_psicologico():
+def grafico_torta_riesgo_psicologico(cubo, hay_psicologico=True):
     """
     Gráfico de torta mostrando la distribución del riesgo psicológico
     en estudiantes que empeoraron
     """
     # Filtrar solo estudiantes que empeoraron
-    df_empeoraron = df_becarios[df_becarios["EVOLUCION"] == "EMPEORO"]
+    df_empeoraron = cubo[cubo["EVOLUCION"] == "EMPEORO"]
     
     if df_empeoraron.empty:
         fig = go.Figure()
@@ -573,17 +1334,11 @@ def grafico_torta_riesgo_psicologico():
         )
         return fig
     
-    # Buscar la columna de riesgo psicológico
-    col_psicologico = None
-    for col in df_empeoraron.columns:
-        if "RIESGO PSICOLÓGICO" in col.upper() and "2025" in col and "2" in col:
-            col_psicologico = col
-            break
-    
-    if not col_psicologico:
+    # Verificar si existe la columna de riesgo psicológico
+    if not hay_psicologico:
         fig = go.Figure()
         fig.add_annotation(
-            text="Columna 'RIESGO PSICOLÓGICO INICIAL 2025-2' no encontrada",
+            text="Columna 'RIESGO PSICOLÓGICO' no encontrada",
             xref="paper", yref="paper",
             x=0.5, y=0.5, showarrow=False,
             font=dict(size=14, color="orange")
@@ -594,26 +1349,13 @@ def grafico_torta_riesgo_psicologico():
         )
         return fig
     
-    # Función para limpiar riesgo psicológico
-    def limpiar_riesgo_psicologico(valor):
-        if pd.isna(valor):
-            return "NO LLENARON ENCUESTA"
-        v = str(valor).upper().strip()
-        if "BAJO" in v:
-            return "BAJO"
-        elif "MEDIO" in v:
-            return "MEDIO"  
-        elif "ALTO" in v:
-            return "ALTO"
-        else:
-            return "NO LLENARON ENCUESTA"
-    
-    # Aplicar limpieza
-    df_empeoraron_psico = df_empeoraron.copy()
-    df_empeoraron_psico["RIESGO_PSICO_LIMPIO"] = df_empeoraron_psico[col_psicologico].apply(limpiar_riesgo_psicologico)
-    
-    # Contar distribución
-    conteo_psico = df_empeoraron_psico["RIESGO_PSICO_LIMPIO"].value_counts().reset_index()
+    # Contar distribución (el cubo ya trae el riesgo psicológico limpio)
+    conteo_psico = (
+        df_empeoraron.groupby("RIESGO_PSICOLOGICO")["N"]
+        .sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
     conteo_psico.columns = ["NIVEL", "CANTIDAD"]
     
     # Definir colores para cada nivel
@@ -681,31 +1423,82 @@ def grafico_torta_riesgo_psicologico():
     )
     
     return fig
+
+# ================================
+#  GRÁFICO: TRANSICIONES DE RIESGO (SANKEY)
+# ================================
+COLORES_NIVEL = {
+    "ALTO": COLORS['danger'],
+    "MEDIO": COLORS['warning'],
+    "BAJO": COLORS['secondary'],
+    "NO ENCONTRADO": "#ADB5BD",
+}
+
+def color_transparente(color_hex, opacidad):
+    r, g, b = (int(color_hex[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r},{g},{b},{opacidad})"
+
+def grafico_transiciones(matriz, par):
+    """Sankey de niveles del período inicial (izquierda) al final (derecha)"""
+    niveles = list(NIVELES_RIESGO[ORDEN_TRANSICION])
+    conteos = matriz[np.ix_(ORDEN_TRANSICION, ORDEN_TRANSICION)]
+    origen, destino = np.nonzero(conteos)
+
+    fig = go.Figure(go.Sankey(
+        arrangement="snap",
+        node=dict(
+            label=[f"{nivel} ({par[0]})" for nivel in niveles] + [f"{nivel} ({par[1]})" for nivel in niveles],
+            color=[COLORES_NIVEL[nivel] for nivel in niveles] * 2,
+            pad=18,
+            thickness=18,
+            line=dict(color="white", width=1)
+        ),
+        link=dict(
+            source=origen.tolist(),
+            target=(destino + len(niveles)).tolist(),
+            value=conteos[origen, destino].tolist(),
+            color=[color_transparente(COLORES_NIVEL[niveles[i]], 0.35) for i in origen]
+        )
+    ))
+    fig.update_layout(
+        title={
+            'text': f'<b>🔀 Transiciones de Nivel de Riesgo ({par[0]} → {par[1]})</b>',
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 18, 'color': COLORS['primary']}
+        },
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12),
+        height=450,
+        margin=dict(t=90, b=30, l=30, r=30)
+    )
+    return fig
+
 # ================================
-#  TABLA: MODALIDAD vs NIVELES (2025-2) - ORDENADA POR TOTAL
+#  TABLA: MODALIDAD vs NIVELES (PERÍODO FINAL) - ORDENADA POR TOTAL
 # ================================
-def tabla_modalidad_niveles_2025_2():
-    df_2025_2 = df_becarios[df_becarios["RIESGO_2025_2"].isin(orden_niveles)]
+def tabla_modalidad_niveles(cubo, hay_modalidad=True):
+    df_final = cubo[cubo["RIESGO_FINAL"].isin(orden_niveles)]
 
-    if df_2025_2.empty:
+    if df_final.empty:
         return html.Div("No hay datos disponibles para mostrar", 
                        style={'textAlign': 'center', 'color': 'gray', 'padding': '20px'})
 
     # Verificar si existe la columna MODALIDAD
-    if "MODALIDAD" not in df_2025_2.columns:
+    if not hay_modalidad:
         return html.Div("Columna 'MODALIDAD' no encontrada en los datos", 
                        style={'textAlign': 'center', 'color': 'orange', 'padding': '20px'})
 
-    # TABLA ORIGINAL: Modalidad vs Niveles de Riesgo (2025-2)
+    # TABLA ORIGINAL: Modalidad vs Niveles de Riesgo (período final)
     tabla_niveles = (
-        df_2025_2.groupby(["MODALIDAD", "RIESGO_2025_2"])
-        .size()
+        df_final.groupby(["MODALIDAD", "RIESGO_FINAL"])["N"]
+        .sum()
         .reset_index(name="CANTIDAD")
     )
     
     tabla_pivot_niveles = tabla_niveles.pivot(
         index="MODALIDAD", 
-        columns="RIESGO_2025_2", 
+        columns="RIESGO_FINAL", 
         values="CANTIDAD"
     ).fillna(0).reset_index()
 
@@ -720,16 +1513,16 @@ def tabla_modalidad_niveles_2025_2():
 
     # NUEVA FUNCIONALIDAD: Agregar columnas de evolución por modalidad
     # Filtrar solo estudiantes que tienen datos válidos en ambos períodos (ALTO, MEDIO, BAJO)
-    df_evolucion_valida = df_becarios[
-        (df_becarios["RIESGO_2025_1"].isin(["ALTO", "MEDIO", "BAJO"])) & 
-        (df_becarios["RIESGO_2025_2"].isin(["ALTO", "MEDIO", "BAJO"])) &
-        (df_becarios["EVOLUCION"].isin(["MEJORO", "EMPEORO", "SE MANTUVO"])) &
-        (df_becarios["MODALIDAD"].notna())
+    df_evolucion_valida = cubo[
+        (cubo["RIESGO_INICIAL"].isin(["ALTO", "MEDIO", "BAJO"])) & 
+        (cubo["RIESGO_FINAL"].isin(["ALTO", "MEDIO", "BAJO"])) &
+        (cubo["EVOLUCION"].isin(["MEJORO", "EMPEORO", "SE MANTUVO"])) &
+        (cubo["MODALIDAD"].notna())
     ]
     
     tabla_evolucion = (
-        df_evolucion_valida.groupby(["MODALIDAD", "EVOLUCION"])
-        .size()
+        df_evolucion_valida.groupby(["MODALIDAD", "EVOLUCION"])["N"]
+        .sum()
         .reset_index(name="CANTIDAD")
     )
     
@@ -876,233 +1669,1117 @@ def tabla_modalidad_niveles_2025_2():
 # ================================
 #  TABLA DE RIESGO ESTILIZADA
 # ================================
-tabla_riesgo = dash_table.DataTable(
-    columns=[{"name": i, "id": i} for i in tabla_resumen.columns],
-    data=tabla_resumen.to_dict("records"),
-    style_table={
-        "overflowX": "auto",
-        "borderRadius": "15px",
-        "overflow": "hidden",
-        "boxShadow": "0 4px 15px rgba(0,0,0,0.1)"
-    },
-    style_header={
-        "backgroundColor": COLORS['primary'],
-        "color": "white",
-        "fontWeight": "bold",
-        "textAlign": "center",
-        "border": "none",
-        "fontSize": "14px"
-    },
-    style_cell={
-        "textAlign": "center",
-        "backgroundColor": "#ffffff",
-        "color": "#333",
-        "padding": "12px",
-        "border": "1px solid #e0e0e0",
-        "fontSize": "13px"
-    },
-    style_data_conditional=[
-        {
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#f8f9fa'
-        }
-    ]
-)
+def crear_tabla_riesgo(tabla_resumen):
+    return dash_table.DataTable(
+        columns=[{"name": i, "id": i} for i in tabla_resumen.columns],
+        data=tabla_resumen.to_dict("records"),
+        style_table={
+            "overflowX": "auto",
+            "borderRadius": "15px",
+            "overflow": "hidden",
+            "boxShadow": "0 4px 15px rgba(0,0,0,0.1)"
+        },
+        style_header={
+            "backgroundColor": COLORS['primary'],
+            "color": "white",
+            "fontWeight": "bold",
+            "textAlign": "center",
+            "border": "none",
+            "fontSize": "14px"
+        },
+        style_cell={
+            "textAlign": "center",
+            "backgroundColor": "#ffffff",
+            "color": "#333",
+            "padding": "12px",
+            "border": "1px solid #e0e0e0",
+            "fontSize": "13px"
+        },
+        style_data_conditional=[
+            {
+                'if': {'row_index': 'odd'},
+                'backgroundColor': '#f8f9fa'
+            }
+        ]
+    )
 
 # ================================
-#  LAYOUT PRINCIPAL
+#  SNAPSHOT DE DATOS
 # ================================
-app.layout = html.Div([
-    # Header con gradiente
-    html.Div([
-        html.Div([
-            html.H1([
-                html.I(className="fas fa-graduation-cap", style={'marginRight': '15px'}),
-                "Dashboard de Becarios 2025"
-            ], className="text-center", style={
-                'color': 'white', 
-                'fontWeight': 'bold',
-                'fontSize': '2.5rem',
-                'textShadow': '2px 2px 4px rgba(0,0,0,0.3)',
-                'margin': '0'
-            }),
-            html.P("Análisis del Riesgo Académico", 
-                   className="text-center", style={
-                'color': 'rgba(255,255,255,0.9)', 
-                'fontSize': '1.1rem',
-                'marginTop': '10px',
-                'marginBottom': '0'
-            })
-        ], style={'padding': '40px 0'})
-    ], style={
-        'background': f'linear-gradient(135deg, {COLORS["primary"]} 0%, {COLORS["info"]} 100%)',
-        'marginBottom': '30px'
-    }),
-
-    dbc.Container([
-        # KPIs Principales
-        html.Div([
-            html.H3("📈 Indicadores Clave", style={
-                'color': COLORS['primary'], 
-                'fontWeight': 'bold',
-                'marginBottom': '25px',
-                'textAlign': 'center'
-            })
-        ]),
-        
-        dbc.Row([
-            dbc.Col(tarjeta_moderna(
-                "Total de Becarios", 
-                total_becarios, 
-                COLORS['primary'], 
-                "users",
-                "Población total"
-            ), lg=3, md=6, sm=12),
-            dbc.Col(tarjeta_moderna(
-                "Mejoraron", 
-                mejoraron, 
-                COLORS['success'], 
-                "arrow-up",
-                "Evolución positiva"
-            ), lg=3, md=6, sm=12),
-            dbc.Col(tarjeta_moderna(
-                "Empeoraron", 
-                empeoraron, 
-                COLORS['danger'], 
-                "arrow-down",
-                "Evolución negativa"
-            ), lg=3, md=6, sm=12),
-            dbc.Col(tarjeta_moderna(
-                "Se Mantuvieron", 
-                se_mantuvieron, 
-                COLORS['secondary'], 
-                "minus",
-                "Sin cambios"
-            ), lg=3, md=6, sm=12),
-        ], className="mb-4"),
+# Todas las tablas, KPIs y gráficos derivados de una misma versión de la base.
+# Se construye completo fuera de las peticiones y se publica de una sola vez,
+# así los callbacks nunca ven un estado a medio actualizar.
+@dataclass(frozen=True)
+class Snapshot:
+    version: str
+    df_becarios: pd.DataFrame
+    cubo: pd.DataFrame
+    hay_modalidad: bool
+    hay_psicologico: bool
+    riesgo_resumen: pd.DataFrame
+    tabla_resumen: pd.DataFrame
+    riesgo_validos: pd.DataFrame
+    riesgo_no_encontrado: pd.DataFrame
+    total_becarios: int
+    mejoraron: int
+    empeoraron: int
+    se_mantuvieron: int
+    tabla_riesgo: object
+    # Períodos de la base en orden cronológico y el par que se muestra por defecto
+    periodos: tuple
+    par: tuple
+    # xlsx de origen, para leer las filas completas al exportar
+    fuente: str = None
+    cargado_en: float = field(default_factory=time.time)
+    # Resultados derivados bajo demanda (gráficos, exportaciones) de esta versión
+    cache: dict = field(default_factory=dict, repr=False, compare=False)
+    candados: dict = field(default_factory=dict, repr=False, compare=False)
+    lock: object = field(default_factory=threading.Lock, repr=False, compare=False)
+    # Vistas por combinación de filtros (con límite, ver memoizar_vista)
+    vistas: OrderedDict = field(default_factory=OrderedDict, repr=False, compare=False)
+    # Filas de la tabla de estudiantes por filtro y orden (con límite en bytes, ver memoizar_filas)
+    filas: OrderedDict = field(default_factory=OrderedDict, repr=False, compare=False)
 
-        html.Hr(style={'border': f'1px solid {COLORS["primary"]}', 'margin': '40px 0'}),
+def construir_snapshot(df, version, fuente=None):
+    periodos = tuple(periodos_becarios(df))
+    par = par_por_defecto(periodos)
+    with medir("cubo"):
+        cubo = construir_cubo(df, par)
+    riesgo_resumen, tabla_resumen, riesgo_validos, riesgo_no_encontrado = calcular_resumen(cubo, par)
+    total_becarios, mejoraron, empeoraron, se_mantuvieron = calcular_kpis(cubo)
 
-        # Gráficos principales
-        html.Div([
-            html.H3("📊 Análisis Visual", style={
-                'color': COLORS['primary'], 
-                'fontWeight': 'bold',
-                'marginBottom': '25px',
-                'textAlign': 'center'
-            })
-        ]),
+    return Snapshot(
+        version=version,
+        df_becarios=df,
+        cubo=cubo,
+        hay_modalidad="MODALIDAD" in df.columns,
+        hay_psicologico="RIESGO_PSICOLOGICO" in df.columns,
+        riesgo_resumen=riesgo_resumen,
+        tabla_resumen=tabla_resumen,
+        riesgo_validos=riesgo_validos,
+        riesgo_no_encontrado=riesgo_no_encontrado,
+        total_becarios=total_becarios,
+        mejoraron=mejoraron,
+        empeoraron=empeoraron,
+        se_mantuvieron=se_mantuvieron,
+        tabla_riesgo=crear_tabla_riesgo(tabla_resumen),
+        periodos=periodos,
+        par=par,
+        fuente=fuente,
+    )
 
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    dcc.Graph(figure=grafico_riesgo())
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+def memoizar(snap, clave, construir):
+    """
+    Calcula construir() una sola vez por snapshot. Si varias peticiones lo
+    piden a la vez, solo una lo construye y las demás esperan el resultado
+    """
+    if clave in snap.cache:
+        return snap.cache[clave]
+    with snap.lock:
+        candado = snap.candados.setdefault(clave, threading.Lock())
+    with candado:
+        if clave not in snap.cache:
+            snap.cache[clave] = construir()
+    return snap.cache[clave]
+
+# Máximo de combinaciones de filtros guardadas por snapshot
+MAX_VISTAS_FILTRADAS = 256
+
+def memoizar_vista(snap, clave, construir):
+    """
+    Como memoizar, pero para resultados por combinación de filtros: guarda
+    las últimas MAX_VISTAS_FILTRADAS y descarta las menos usadas
+    """
+    with snap.lock:
+        if clave in snap.vistas:
+            snap.vistas.move_to_end(clave)
+            return snap.vistas[clave]
+    valor = construir()
+    guardar_vista(snap, clave, valor)
+    return valor
+
+def guardar_vista(snap, clave, valor):
+    with snap.lock:
+        snap.vistas[clave] = valor
+        while len(snap.vistas) > MAX_VISTAS_FILTRADAS:
+            snap.vistas.popitem(last=False)
+
+# Bytes máximos de posiciones de fila guardadas por snapshot: un arreglo por
+# filtro y orden de la tabla de estudiantes, que va aparte de las vistas para
+# no desplazar cubos ni respuestas (cada tecla en el filtro es una entrada)
+MAX_BYTES_FILAS = int(os.environ.get("BECARIOS_MAX_MB_FILAS", "16")) * 2**20
+
+def memoizar_filas(snap, clave, construir):
+    """
+    Como memoizar_vista, para arreglos de posiciones de fila: descarta los
+    menos usados cuando el total pasa de MAX_BYTES_FILAS (siempre queda el último)
+    """
+    with snap.lock:
+        if clave in snap.filas:
+            snap.filas.move_to_end(clave)
+            return snap.filas[clave]
+    posiciones = construir()
+    with snap.lock:
+        snap.filas[clave] = posiciones
+        total = sum(p.nbytes for p in snap.filas.values())
+        while total > MAX_BYTES_FILAS and len(snap.filas) > 1:
+            total -= snap.filas.popitem(last=False)[1].nbytes
+    return posiciones
+
+def normalizar_par(snap, inicial, final):
+    """
+    Par (inicial, final) de períodos del snapshot. Los selectores solo
+    permiten un final posterior al inicial (ver periodos_posteriores); el par
+    por defecto queda para valores de otra versión de los datos
+    """
+    if inicial in snap.periodos and final in periodos_posteriores(snap.periodos, inicial):
+        return inicial, final
+    return snap.par
+
+def cubo_par(snap, par):
+    """Cubo del par de períodos; el del par por defecto ya viene en el snapshot"""
+    if par == snap.par:
+        return snap.cubo
+    def construir():
+        with medir("cubo"):
+            return construir_cubo(snap.df_becarios, par)
+    return memoizar_vista(snap, ("cubo", par), construir)
+
+def cubo_filtrado(snap, filtros, par=None):
+    par = par or snap.par
+    if filtros == SIN_FILTROS:
+        return cubo_par(snap, par)
+    return memoizar_vista(snap, ("cubo", filtros, par), lambda: filtrar_cubo(cubo_par(snap, par), filtros))
+
+def vista(snap, clave, filtros, construir, par=None):
+    """Resultado de construir(cubo) para los filtros y el par de períodos dados, memoizado"""
+    par = par or snap.par
+    if filtros == SIN_FILTROS and par == snap.par:
+        return memoizar(snap, clave, lambda: construir(snap.cubo))
+    return memoizar_vista(snap, (clave, filtros, par), lambda: construir(cubo_filtrado(snap, filtros, par)))
+
+# Gráficos del dashboard; se construyen la primera vez que se piden
+CONSTRUCTORES_FIGURAS = {
+    "riesgo": lambda snap, cubo, par: grafico_riesgo(calcular_resumen(cubo, par)[2], par),
+    "no_encontrado": lambda snap, cubo, par: grafico_no_encontrado(cubo, par),
+    "empeoraron_modalidad": lambda snap, cubo, par: grafico_empeoraron_por_modalidad(cubo, snap.hay_modalidad),
+    "riesgo_psicologico": lambda snap, cubo, par: grafico_torta_riesgo_psicologico(cubo, snap.hay_psicologico),
+    "transiciones": lambda snap, cubo, par: grafico_transiciones(obtener_matriz_transicion(snap, par), par),
+}
+# grafico_no_encontrado compara contra el total de cada período (TOTALES_PERIODO),
+# que no se puede filtrar; las transiciones se cuentan sobre toda la base
+FIGURAS_FILTRABLES = ["riesgo", "empeoraron_modalidad", "riesgo_psicologico"]
+
+def obtener_figura(snap, nombre, filtros=SIN_FILTROS, par=None):
+    par = par or snap.par
+    def construir(cubo):
+        with medir(f"grafico_{nombre}"):
+            return CONSTRUCTORES_FIGURAS[nombre](snap, cubo, par)
+    return vista(snap, ("figura", nombre), filtros, construir, par)
+
+def obtener_tabla_modalidad(snap, filtros=SIN_FILTROS, par=None):
+    def construir(cubo):
+        with medir("tabla_modalidad"):
+            return tabla_modalidad_niveles(cubo, snap.hay_modalidad)
+    return vista(snap, "tabla_modalidad", filtros, construir, par)
+
+def obtener_kpis(snap, filtros=SIN_FILTROS, par=None):
+    return vista(snap, "kpis", filtros, lambda cubo: tarjetas_kpi(*calcular_kpis(cubo)), par)
+
+def obtener_matriz_transicion(snap, par=None):
+    par = par or snap.par
+    def construir():
+        with medir("matriz_transicion"):
+            return matriz_transicion(snap.df_becarios, par)
+    return memoizar(snap, ("matriz_transicion", par), construir)
+
+def obtener_tabla_transicion(snap, par=None):
+    par = par or snap.par
+    return memoizar(
+        snap, ("tabla_transicion", par),
+        lambda: crear_tabla_riesgo(tabla_transicion(obtener_matriz_transicion(snap, par), par))
+    )
+
+def obtener_tabla_riesgo(snap, par=None):
+    par = par or snap.par
+    if par == snap.par:
+        return snap.tabla_riesgo
+    return vista(snap, "tabla_riesgo", SIN_FILTROS, lambda cubo: crear_tabla_riesgo(calcular_resumen(cubo, par)[1]), par)
+
+_snapshot = None
+
+def obtener_snapshot():
+    return _snapshot
+
+def publicar_snapshot(snap):
+    # Una sola asignación: los lectores ven el snapshot anterior o el nuevo
+    global _snapshot
+    _snapshot = snap
+
+# ================================
+#  LEER BASE BECARIOS
+# ================================
+file_id = "1OOiHkMC4XOXgFBwId1hjKMfBt7QuY2lj"  # ID de BECARIOS
+url = os.environ.get(
+    "BECARIOS_URL",
+    f"https://drive.google.com/uc?export=download&id={file_id}"
+)
+
+# La carga no ocurre al importar: un hilo en segundo plano la hace (ver
+# iniciar_refresco) y mientras tanto la página muestra "cargando datos". Si
+# falla, el error se muestra tal cual y se reintenta; nunca se usan datos de
+# ejemplo. BECARIOS_CARGA_AUTOMATICA=false deja la carga en manos de quien
+# importa el módulo (benchmark, scripts).
+CARGA_AUTOMATICA = os.environ.get("BECARIOS_CARGA_AUTOMATICA", "true").lower() == "true"
+# Segundos entre reintentos mientras la primera carga falle
+REINTENTO_CARGA = int(os.environ.get("BECARIOS_REINTENTO_SEG", "30"))
+
+_error_carga = None
+
+def error_carga():
+    return _error_carga
+
+def cargar_datos_iniciales():
+    """Primera carga de la fuente. Devuelve el snapshot publicado o None si falló"""
+    global _error_carga
+    try:
+        df, version, fuente = cargar_becarios(url)
+    except Exception as e:
+        _error_carga = f"{type(e).__name__}: {e}"
+        incrementar("becarios_refrescos_total", resultado="error")
+        print(f"Error al cargar datos: {e}")
+        return None
+
+    _error_carga = None
+    snap = construir_snapshot(df, version, fuente)
+    publicar_snapshot(snap)
+    return snap
+
+# ================================
+#  REFRESCO PERIÓDICO EN SEGUNDO PLANO
+# ================================
+# Segundos entre recargas de la fuente (0 desactiva el refresco)
+INTERVALO_REFRESCO = int(os.environ.get("BECARIOS_REFRESCO_SEG", "900"))
+
+def refrescar_datos():
+    """
+    Vuelve a leer la fuente y, si cambió, publica un snapshot nuevo.
+    Devuelve True si hubo cambio
+    """
+    actual = obtener_snapshot()
+    df, version, fuente = cargar_becarios(url, version_actual=actual.version if actual else None)
+    if df is None:
+        return False
+
+    # El snapshot anterior sigue respondiendo mientras el nuevo se precalienta:
+    # así los gráficos y el Excel no se arman en la ruta de las peticiones
+    nuevo = construir_snapshot(df, version, fuente)
+    try:
+        precalentar(nuevo)
+    except Exception as e:
+        print(f"Error al precalentar: {e}")
+    publicar_snapshot(nuevo)
+    limpiar_exportaciones(nuevo)
+    return True
+
+def precalentar(snap):
+    """Deja listos gráficos y exportación antes de que los pidan"""
+    for nombre in CONSTRUCTORES_FIGURAS:
+        obtener_figura(snap, nombre)
+    obtener_tabla_modalidad(snap)
+    obtener_tabla_transicion(snap)
+    obtener_kpis(snap)
+    obtener_indice_nombres(snap)
+    obtener_excel(snap)
+    print(f"Memoria de df_becarios (versión {snap.version}):")
+    print(obtener_reporte_memoria(snap).to_string(index=False))
+
+def obtener_reporte_memoria(snap):
+    return memoizar(snap, "reporte_memoria", lambda: reporte_memoria(snap.df_becarios))
+
+def _bucle_refresco():
+    while obtener_snapshot() is None:
+        snap = cargar_datos_iniciales()
+        if snap is None:
+            time.sleep(REINTENTO_CARGA)
+            continue
+        print(f"Datos cargados (versión {snap.version})")
+        try:
+            precalentar(snap)
+        except Exception as e:
+            print(f"Error al precalentar: {e}")
+
+    if INTERVALO_REFRESCO <= 0:
+        return
+    while True:
+        time.sleep(INTERVALO_REFRESCO)
+        try:
+            if refrescar_datos():
+                incrementar("becarios_refrescos_total", resultado="cambio")
+                print(f"Datos actualizados (versión {obtener_snapshot().version})")
+            else:
+                incrementar("becarios_refrescos_total", resultado="sin_cambio")
+        except Exception as e:
+            incrementar("becarios_refrescos_total", resultado="error")
+            print(f"Error al refrescar datos: {e}")
+
+def iniciar_refresco():
+    if INTERVALO_REFRESCO <= 0 and obtener_snapshot() is not None:
+        return None
+    objetivo = _vigilar_fuente if MODO_PRELOAD else _bucle_refresco
+    hilo = threading.Thread(target=objetivo, name="refresco-becarios", daemon=True)
+    hilo.start()
+    return hilo
+
+# ================================
+#  REFRESCO CENTRAL CON PRELOAD
+# ================================
+# Con preload_app (gunicorn.conf.py) el snapshot vive en el maestro y los
+# workers lo comparten por copy-on-write. Para no perder eso en cada cambio
+# de la fuente, los workers no publican snapshots propios: uno solo a la vez
+# vigila la fuente y, cuando cambia (o si todavía no hay datos), deja la
+# cache Parquet y el Excel listos en disco y le pide al maestro con SIGHUP
+# que recargue (recargar_en_maestro, ya desde la cache) y vuelva a crear los
+# workers. Los workers anteriores siguen respondiendo hasta que llegan los nuevos.
+MODO_PRELOAD = os.environ.get("BECARIOS_MODO_PRELOAD") == "1"
+
+def _vigilar_fuente():
+    global _error_carga
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # El candado se toma una vez y queda tomado mientras viva este worker
+    candado = open(os.path.join(CACHE_DIR, "vigilancia.lock"), "a")
+    # Sin datos se carga enseguida, salvo que el maestro acabe de fallar (el
+    # error se hereda con el fork): entonces se espera como en cualquier reintento
+    if obtener_snapshot() is not None:
+        espera = INTERVALO_REFRESCO
+    else:
+        espera = REINTENTO_CARGA if _error_carga else 0
+    while espera > 0 or obtener_snapshot() is None:
+        time.sleep(espera)
+        actual = obtener_snapshot()
+        espera = REINTENTO_CARGA if actual is None else INTERVALO_REFRESCO
+        try:
+            fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            continue  # otro worker está vigilando
+
+        try:
+            df, version, fuente = cargar_becarios(url, version_actual=actual.version if actual else None)
+            if df is None:
+                incrementar("becarios_refrescos_total", resultado="sin_cambio")
+                continue
+            obtener_excel(construir_snapshot(df, version, fuente))
+        except Exception as e:
+            _error_carga = f"{type(e).__name__}: {e}"
+            incrementar("becarios_refrescos_total", resultado="error")
+            print(f"Error al refrescar datos: {e}")
+            continue
+        print(f"Fuente nueva (versión {version}): se pide al maestro que recargue")
+        os.kill(os.getppid(), signal.SIGHUP)
+        return
+
+def recargar_en_maestro():
+    """Hook on_reload de gunicorn: carga o refresca el snapshot antes de crear los workers nuevos"""
+    try:
+        if obtener_snapshot() is None:
+            snap = cargar_datos_iniciales()
+            if snap is not None:
+                precalentar(snap)
+        elif refrescar_datos():
+            incrementar("becarios_refrescos_total", resultado="cambio")
+    except Exception as e:
+        incrementar("becarios_refrescos_total", resultado="error")
+        print(f"Error al recargar en el maestro: {e}")
+    if obtener_snapshot() is not None:
+        print(f"Datos en el maestro (versión {obtener_snapshot().version})")
+
+# ================================
+#  GRÁFICOS DIFERIDOS
+# ================================
+# Con gráficos diferidos, el layout lleva contenedores vacíos y cada gráfico
+# llega por su propio callback (memoizado por versión de datos), así los KPIs
+# se muestran de inmediato sin esperar a los gráficos de más abajo.
+GRAFICOS_DIFERIDOS = os.environ.get("BECARIOS_GRAFICOS_DIFERIDOS", "true").lower() == "true"
+
+def grafico_en_layout(snap, nombre):
+    if not GRAFICOS_DIFERIDOS:
+        return dcc.Graph(id=f"grafico-{nombre}", figure=obtener_figura(snap, nombre))
+    return dcc.Loading(
+        dcc.Graph(id=f"grafico-{nombre}", className="grafico-diferido"),
+        type="circle", color=COLORS['primary']
+    )
+
+def tabla_modalidad_en_layout(snap):
+    if not GRAFICOS_DIFERIDOS:
+        return html.Div(obtener_tabla_modalidad(snap), id="tabla-modalidad")
+    return dcc.Loading(html.Div(id="tabla-modalidad"), type="circle", color=COLORS['warning'])
+
+# ================================
+#  FILTROS
+# ================================
+# Los filtros responden desde el cubo de conteos (y vistas memoizadas por
+# combinación), nunca recorriendo df_becarios.
+ENTRADAS_FILTROS = [
+    Input("filtro-modalidad", "value"),
+    Input("filtro-beneficio", "value"),
+    Input("filtro-evolucion", "value"),
+]
+# Par de períodos que se compara (inicial, final)
+ENTRADAS_PERIODOS = [
+    Input("periodo-inicial", "value"),
+    Input("periodo-final", "value"),
+]
+
+def opciones_filtro(cubo, columna):
+    valores = sorted(cubo[columna].dropna().unique(), key=str)
+    return [{"label": str(v), "value": v} for v in valores]
+
+def opciones_evolucion(par):
+    return [{"label": f" {e.title()}", "value": e} for e in etiquetas_evolucion(par) if e != "OTRO"]
+
+def panel_filtros(snap):
+    opciones_modalidad = opciones_filtro(snap.cubo, "MODALIDAD")
+    opciones_beneficio = opciones_filtro(snap.cubo, "TIPO DE BENEFICIO")
+    return html.Div([
+        dbc.Row([
+            dbc.Col([
+                html.Label("Modalidad", className="etiqueta-filtro"),
+                dcc.Dropdown(
+                    id="filtro-modalidad", options=opciones_modalidad, multi=True,
+                    placeholder="Todas las modalidades", disabled=not opciones_modalidad
+                )
+            ], lg=4, md=12),
+            dbc.Col([
+                html.Label("Tipo de beneficio", className="etiqueta-filtro"),
+                dcc.Dropdown(
+                    id="filtro-beneficio", options=opciones_beneficio, multi=True,
+                    placeholder="Todos los beneficios", disabled=not opciones_beneficio
+                )
+            ], lg=3, md=12),
+            dbc.Col([
+                html.Label("Evolución", className="etiqueta-filtro"),
+                dcc.Checklist(
+                    id="filtro-evolucion",
+                    options=opciones_evolucion(snap.par),
+                    value=[], inline=True,
+                    inputStyle={'marginLeft': '12px'},
+                    style={'fontSize': '0.85rem', 'paddingTop': '6px'}
+                )
+            ], lg=5, md=12),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                html.Label("Período inicial", className="etiqueta-filtro"),
+                dcc.Dropdown(
+                    id="periodo-inicial", options=list(snap.periodos[:-1]), value=snap.par[0], clearable=False
+                )
+            ], lg=2, md=6),
+            dbc.Col([
+                html.Label("Período final", className="etiqueta-filtro"),
+                dcc.Dropdown(
+                    id="periodo-final", options=periodos_posteriores(snap.periodos, snap.par[0]),
+                    value=snap.par[1], clearable=False
+                )
+            ], lg=2, md=6),
+        ], className="mt-2")
+    ], className="recuadro panel-filtros")
+
+def registrar_callback_figura(nombre):
+    entradas = [Input("version-datos", "data")] + ENTRADAS_PERIODOS
+    if nombre in FIGURAS_FILTRABLES:
+        entradas += ENTRADAS_FILTROS
+
+    @app.callback(
+        Output(f"grafico-{nombre}", "figure"),
+        entradas,
+        prevent_initial_call=not GRAFICOS_DIFERIDOS
+    )
+    def actualizar_figura(_version, inicial, final, *filtros):
+        snap = obtener_snapshot()
+        par = normalizar_par(snap, inicial, final)
+        if not filtros:
+            return obtener_figura(snap, nombre, par=par)
+        return obtener_figura(snap, nombre, normalizar_filtros(*filtros), par)
+
+for _nombre in CONSTRUCTORES_FIGURAS:
+    registrar_callback_figura(_nombre)
+
+@app.callback(
+    [Output("tabla-modalidad", "children"),
+     Output("titulo-periodo-final", "children")],
+    [Input("version-datos", "data")] + ENTRADAS_PERIODOS + ENTRADAS_FILTROS,
+    prevent_initial_call=not GRAFICOS_DIFERIDOS
+)
+def actualizar_tabla_modalidad(_version, inicial, final, modalidades, beneficios, evoluciones):
+    snap = obtener_snapshot()
+    par = normalizar_par(snap, inicial, final)
+    filtros = normalizar_filtros(modalidades, beneficios, evoluciones)
+    return obtener_tabla_modalidad(snap, filtros, par), par[1]
+
+@app.callback(
+    Output("kpis", "children"),
+    ENTRADAS_PERIODOS + ENTRADAS_FILTROS,
+    prevent_initial_call=True
+)
+def actualizar_kpis(inicial, final, modalidades, beneficios, evoluciones):
+    snap = obtener_snapshot()
+    filtros = normalizar_filtros(modalidades, beneficios, evoluciones)
+    return obtener_kpis(snap, filtros, normalizar_par(snap, inicial, final))
+
+@app.callback(
+    Output("tabla-riesgo", "children"),
+    ENTRADAS_PERIODOS,
+    prevent_initial_call=True
+)
+def actualizar_tabla_riesgo(inicial, final):
+    snap = obtener_snapshot()
+    return obtener_tabla_riesgo(snap, normalizar_par(snap, inicial, final))
+
+@app.callback(
+    Output("tabla-transiciones", "children"),
+    ENTRADAS_PERIODOS,
+    prevent_initial_call=True
+)
+def actualizar_tabla_transicion(inicial, final):
+    snap = obtener_snapshot()
+    return obtener_tabla_transicion(snap, normalizar_par(snap, inicial, final))
+
+@app.callback(
+    [Output("periodo-final", "options"),
+     Output("periodo-final", "value")],
+    Input("periodo-inicial", "value"),
+    State("periodo-final", "value"),
+    prevent_initial_call=True
+)
+def actualizar_periodos_finales(inicial, final):
+    """
+    El final se elige entre los períodos posteriores al inicial; si el que
+    estaba elegido ya no lo es, pasa al siguiente del inicial (y se ve en el selector)
+    """
+    posteriores = periodos_posteriores(obtener_snapshot().periodos, inicial)
+    if not posteriores:
+        return no_update, no_update
+    return posteriores, final if final in posteriores else posteriores[0]
+
+@app.callback(
+    [Output("filtro-evolucion", "options"),
+     Output("filtro-evolucion", "value")],
+    ENTRADAS_PERIODOS + [State("filtro-evolucion", "value")],
+    prevent_initial_call=True
+)
+def actualizar_opciones_evolucion(inicial, final, evoluciones):
+    """Las etiquetas "SOLO EN ..." dependen del par; se descartan las que ya no existen"""
+    par = normalizar_par(obtener_snapshot(), inicial, final)
+    validas = set(etiquetas_evolucion(par))
+    return opciones_evolucion(par), [e for e in evoluciones or [] if e in validas]
+
+# ================================
+#  TABLA DE ESTUDIANTES (PAGINADA EN EL SERVIDOR)
+# ================================
+# El navegador solo recibe la página visible. Cada orden por columna se
+# calcula una vez por snapshot y cada combinación de filtro y orden se guarda
+# como un arreglo de posiciones de fila.
+TAMANO_PAGINA = 25
+# Entre TIPO DE BENEFICIO y EVOLUCION va una columna por período (ver columnas_estudiantes)
+COLUMNAS_ESTUDIANTES = [
+    "APELLIDOS Y NOMBRES", "MODALIDAD", "TIPO DE BENEFICIO", "EVOLUCION", "RIESGO_PSICOLOGICO"
+]
+NOMBRES_COLUMNAS_ESTUDIANTES = {
+    "RIESGO_PSICOLOGICO": "RIESGO PSICOLÓGICO",
+}
+
+# Operadores de filter_query de DataTable (con o sin prefijo i/s de mayúsculas)
+OPERADORES_FILTRO = {
+    "=": "eq", "eq": "eq", "!=": "ne", "ne": "ne",
+    "<": "lt", "lt": "lt", "<=": "le", "le": "le",
+    ">": "gt", "gt": "gt", ">=": "ge", "ge": "ge",
+    "contains": "contains", "datestartswith": "datestartswith",
+}
+OPERADORES_TEXTO = {"contains", "datestartswith"}
+_PATRON_FILTRO = re.compile(r"^\{(?P<columna>.+?)\}\s+(?P<operador>\S+)\s+(?P<valor>.+)$")
+
+def columnas_estudiantes(snap):
+    columnas = COLUMNAS_ESTUDIANTES[:3] + [columna_riesgo(p) for p in snap.periodos] + COLUMNAS_ESTUDIANTES[3:]
+    return [c for c in columnas if c in snap.df_becarios.columns] + columnas_auxiliares(snap.df_becarios)
+
+def nombre_columna_estudiante(snap, columna):
+    if columna == "EVOLUCION":
+        return f"EVOLUCIÓN {snap.par[0]} → {snap.par[1]}"
+    coincidencia = _PATRON_COLUMNA_RIESGO.match(columna)
+    if coincidencia:
+        return f"RIESGO {coincidencia[1]}-{coincidencia[2]}"
+    return NOMBRES_COLUMNAS_ESTUDIANTES.get(columna, columna)
+
+def orden_columna(snap, columna, descendente=False):
+    """
+    Posiciones de fila ordenadas por la columna, con los vacíos al final en
+    las dos direcciones. El orden es estable: en descendente los empates
+    también quedan en el orden de la base
+    """
+    def construir():
+        codigos, niveles = pd.factorize(snap.df_becarios[columna], sort=True)
+        if descendente:
+            codigos = np.where(codigos >= 0, len(niveles) - 1 - codigos, codigos)
+        codigos = np.where(codigos < 0, len(niveles), codigos)
+        return np.argsort(codigos, kind="stable").astype(np.int32)
+    return memoizar(snap, ("orden", columna, descendente), construir)
+
+def interpretar_filtro(filter_query):
+    """Divide filter_query en condiciones (columna, operador, valor, sensible a mayúsculas)"""
+    condiciones = []
+    for parte in (filter_query or "").split(" && "):
+        coincidencia = _PATRON_FILTRO.match(parte.strip())
+        if not coincidencia:
+            continue
+        operador = coincidencia["operador"]
+        sensible = True
+        if operador not in OPERADORES_FILTRO and operador[1:] in OPERADORES_FILTRO and operador[0] in "is":
+            sensible = operador[0] == "s"
+            operador = operador[1:]
+        if operador not in OPERADORES_FILTRO:
+            continue
+        operador = OPERADORES_FILTRO[operador]
+
+        # DataTable manda los números sin comillas; solo los operadores de
+        # comparación los usan como número ("icontains 18" busca el texto "18")
+        valor = coincidencia["valor"].strip()
+        if len(valor) > 1 and valor[0] == valor[-1] and valor[0] in "\"'`":
+            valor = valor[1:-1].replace("\\" + valor[0], valor[0])
+        elif operador not in OPERADORES_TEXTO:
+            try:
+                valor = float(valor)
+            except ValueError:
+                pass
+        condiciones.append((coincidencia["columna"], operador, valor, sensible))
+    return condiciones
+
+def mascara_condicion(serie, operador, valor, sensible):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Se evalúa sobre las pocas categorías y se expande por código entero
+        por_categoria = mascara_condicion(pd.Series(serie.cat.categories), operador, valor, sensible)
+        return np.append(por_categoria, False)[serie.cat.codes.to_numpy()]
+
+    if isinstance(valor, float):
+        numeros = pd.to_numeric(serie, errors="coerce")
+        comparaciones = {
+            "eq": numeros == valor, "ne": numeros != valor,
+            "lt": numeros < valor, "le": numeros <= valor,
+            "gt": numeros > valor, "ge": numeros >= valor,
+        }
+        return comparaciones[operador].to_numpy()
+
+    texto = serie.astype("string")
+    valor = str(valor)
+    if operador == "contains":
+        resultado = texto.str.contains(valor, case=sensible, regex=False)
+    elif operador == "datestartswith":
+        resultado = texto.str.startswith(valor)
+    else:
+        if not sensible:
+            texto, valor = texto.str.upper(), valor.upper()
+        comparaciones = {
+            "eq": texto == valor, "ne": texto != valor,
+            "lt": texto < valor, "le": texto <= valor,
+            "gt": texto > valor, "ge": texto >= valor,
+        }
+        resultado = comparaciones[operador]
+    return resultado.fillna(False).to_numpy(dtype=bool)
+
+def filas_estudiantes(snap, filter_query, sort_by):
+    """Posiciones de fila que cumplen el filtro, en el orden pedido"""
+    columnas = columnas_estudiantes(snap)
+    df = snap.df_becarios
+
+    def construir():
+        if sort_by and sort_by[0]["column_id"] in columnas:
+            orden = orden_columna(snap, sort_by[0]["column_id"], sort_by[0]["direction"] == "desc")
+        else:
+            orden = np.arange(len(df), dtype=np.int32)
+
+        condiciones = [c for c in interpretar_filtro(filter_query) if c[0] in columnas]
+        if condiciones:
+            mascara = np.ones(len(df), dtype=bool)
+            for columna, operador, valor, sensible in condiciones:
+                mascara &= mascara_condicion(df[columna], operador, valor, sensible)
+            orden = orden[mascara[orden]]
+        return orden
+
+    clave_orden = tuple((s["column_id"], s["direction"]) for s in (sort_by or [])[:1])
+    return memoizar_filas(snap, (filter_query or "", clave_orden), construir)
+
+def tabla_estudiantes(snap):
+    return dash_table.DataTable(
+        id="tabla-estudiantes",
+        columns=[
+            {"name": nombre_columna_estudiante(snap, c), "id": c}
+            for c in columnas_estudiantes(snap)
+        ],
+        data=[],
+        page_current=0,
+        page_size=TAMANO_PAGINA,
+        page_action="custom",
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
+        filter_action="custom",
+        filter_query="",
+        filter_options={"case": "insensitive"},
+        style_table={
+            "overflowX": "auto",
+            "borderRadius": "15px",
+            "boxShadow": "0 4px 15px rgba(0,0,0,0.1)"
+        },
+        style_header={
+            "backgroundColor": COLORS['dark'],
+            "color": "white",
+            "fontWeight": "bold",
+            "textAlign": "center",
+            "border": "none",
+            "fontSize": "13px",
+            "whiteSpace": "normal",
+            "height": "auto"
+        },
+        style_cell={
+            "textAlign": "center",
+            "backgroundColor": "#ffffff",
+            "color": "#333",
+            "padding": "8px",
+            "border": "1px solid #e0e0e0",
+            "fontSize": "12px",
+            "whiteSpace": "normal",
+            "height": "auto"
+        },
+        style_cell_conditional=[
+            {
+                'if': {'column_id': 'APELLIDOS Y NOMBRES'},
+                'textAlign': 'left',
+                'minWidth': '220px'
+            }
+        ],
+        style_data_conditional=[
+            {
+                'if': {'row_index': 'odd'},
+                'backgroundColor': '#f8f9fa'
+            }
+        ]
+    )
+
+@app.callback(
+    [Output("tabla-estudiantes", "data"),
+     Output("tabla-estudiantes", "page_count")],
+    [Input("tabla-estudiantes", "page_current"),
+     Input("tabla-estudiantes", "page_size"),
+     Input("tabla-estudiantes", "sort_by"),
+     Input("tabla-estudiantes", "filter_query"),
+     Input("version-datos", "data")]
+)
+def paginar_estudiantes(page_current, page_size, sort_by, filter_query, _version):
+    snap = obtener_snapshot()
+    page_current = page_current or 0
+    page_size = page_size or TAMANO_PAGINA
+
+    filas = filas_estudiantes(snap, filter_query, sort_by)
+    pagina = filas[page_current * page_size:(page_current + 1) * page_size]
+
+    df_pagina = snap.df_becarios.iloc[pagina][columnas_estudiantes(snap)].astype(object)
+    df_pagina = df_pagina.where(df_pagina.notna(), None)
+    return df_pagina.to_dict("records"), max(1, math.ceil(len(filas) / page_size))
+
+# ================================
+#  BÚSQUEDA DE BECARIOS POR NOMBRE
+# ================================
+# Índice en memoria sobre APELLIDOS Y NOMBRES normalizados (sin tildes, en
+# mayúsculas), construido una vez por snapshot. Cada palabra del nombre es un
+# token: los prefijos se buscan con bisect sobre la lista ordenada de tokens y
+# los errores de tipeo (una letra de más, de menos o cambiada) con un mapa de
+# borrados de un carácter.
+COLUMNA_NOMBRE = "APELLIDOS Y NOMBRES"
+MAX_RESULTADOS_BUSQUEDA = 8
+# Tokens distintos que se aceptan por prefijo (acota consultas de una letra)
+MAX_TOKENS_PREFIJO = 50
+
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).upper()
+    return " ".join(re.sub(r"[^A-Z0-9Ñ]+", " ", texto).split())
+
+def variantes_borrado(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def construir_indice_nombres(nombres):
+    filas_por_token = {}
+    for fila, nombre in enumerate(nombres):
+        if pd.isna(nombre):
+            continue
+        for token in set(normalizar_texto(nombre).split()):
+            filas_por_token.setdefault(token, []).append(fila)
+
+    borrados = {}
+    for token in filas_por_token:
+        borrados.setdefault(token, set()).add(token)
+        if len(token) >= 4:
+            for variante in variantes_borrado(token):
+                borrados.setdefault(variante, set()).add(token)
+
+    return {
+        "tokens": sorted(filas_por_token),
+        "filas": {token: np.array(filas, dtype=np.int64) for token, filas in filas_por_token.items()},
+        "borrados": borrados,
+    }
+
+def obtener_indice_nombres(snap):
+    def construir():
+        if COLUMNA_NOMBRE not in snap.df_becarios.columns:
+            return construir_indice_nombres([])
+        return construir_indice_nombres(snap.df_becarios[COLUMNA_NOMBRE].tolist())
+    return memoizar(snap, "indice_nombres", construir)
+
+def tokens_coincidentes(indice, termino):
+    """{token: puntaje}: 3 igual, 2 por prefijo, 1 con un error de tipeo"""
+    tokens = indice["tokens"]
+    encontrados = {}
+
+    i = bisect.bisect_left(tokens, termino)
+    while i < len(tokens) and tokens[i].startswith(termino) and len(encontrados) < MAX_TOKENS_PREFIJO:
+        encontrados[tokens[i]] = 3 if tokens[i] == termino else 2
+        i += 1
+
+    if len(termino) >= 4:
+        for variante in variantes_borrado(termino) | {termino}:
+            for token in indice["borrados"].get(variante, ()):
+                encontrados.setdefault(token, 1)
+    return encontrados
+
+def buscar_becarios(indice, consulta, limite=MAX_RESULTADOS_BUSQUEDA):
+    """Posiciones de fila que coinciden con todas las palabras de la consulta, mejores primero"""
+    terminos = normalizar_texto(consulta).split()
+    if not terminos:
+        return []
+
+    puntajes = None
+    for termino in terminos:
+        puntaje_termino = {}
+        for token, puntaje in tokens_coincidentes(indice, termino).items():
+            for fila in indice["filas"][token]:
+                if puntaje > puntaje_termino.get(fila, 0):
+                    puntaje_termino[fila] = puntaje
+        if puntajes is None:
+            puntajes = puntaje_termino
+        else:
+            puntajes = {fila: p + puntaje_termino[fila] for fila, p in puntajes.items() if fila in puntaje_termino}
+        if not puntajes:
+            return []
+
+    return [fila for fila, _ in sorted(puntajes.items(), key=lambda x: (-x[1], x[0]))[:limite]]
+
+def ficha_becario(snap, fila):
+    """Resumen de riesgo de un becario"""
+    registro = snap.df_becarios.iloc[fila]
+    psicologico = registro.get("RIESGO_PSICOLOGICO", "SIN DATO")
+    colores_nivel = {"ALTO": COLORS['danger'], "MEDIO": COLORS['warning'], "BAJO": COLORS['secondary']}
+    colores_evolucion = {"MEJORO": COLORS['secondary'], "EMPEORO": COLORS['danger']}
+
+    def dato(etiqueta, valor, color="#333"):
+        valor = "—" if pd.isna(valor) else valor
+        return html.Div([
+            html.Span(f"{etiqueta}: ", style={'color': '#888', 'fontSize': '0.85rem'}),
+            html.Span(str(valor), style={'color': color, 'fontWeight': 'bold'})
+        ], style={'marginBottom': '6px'})
+
+    return html.Div([
+        html.H5(str(registro.get(COLUMNA_NOMBRE, "")), style={'color': COLORS['primary'], 'fontWeight': 'bold'}),
+        dato("Modalidad", registro.get("MODALIDAD")),
+        dato("Tipo de beneficio", registro.get("TIPO DE BENEFICIO")),
+        *[
+            dato(f"Riesgo {periodo}", registro[columna_riesgo(periodo)],
+                 colores_nivel.get(registro[columna_riesgo(periodo)], "#333"))
+            for periodo in snap.periodos
+        ],
+        dato(f"Evolución {snap.par[0]} → {snap.par[1]}", registro["EVOLUCION"],
+             colores_evolucion.get(registro["EVOLUCION"], "#333")),
+        dato("Riesgo psicológico", psicologico, colores_nivel.get(psicologico, "#333")),
+    ])
+
+def panel_busqueda():
+    return dbc.Row([
+        dbc.Col([
+            dcc.Input(
+                id="buscar-becario", type="search", debounce=False,
+                placeholder="🔎 Buscar becario por apellidos o nombres...",
+                className="form-control"
+            ),
+            dbc.ListGroup(id="resultados-busqueda", style={'marginTop': '8px'})
+        ], lg=6, md=12),
+        dbc.Col(html.Div(id="ficha-becario"), lg=6, md=12)
+    ])
+
+@app.callback(
+    Output("resultados-busqueda", "children"),
+    Input("buscar-becario", "value"),
+    prevent_initial_call=True
+)
+def sugerir_becarios(consulta):
+    snap = obtener_snapshot()
+    filas = buscar_becarios(obtener_indice_nombres(snap), consulta or "")
+    nombres = snap.df_becarios[COLUMNA_NOMBRE].iloc[filas] if filas else []
+    return [
+        dbc.ListGroupItem(
+            str(nombre), action=True, n_clicks=0,
+            id={"type": "resultado-becario", "index": f"{snap.version}:{fila}"}
+        )
+        for fila, nombre in zip(filas, nombres)
+    ]
+
+@app.callback(
+    Output("ficha-becario", "children"),
+    Input({"type": "resultado-becario", "index": ALL}, "n_clicks"),
+    prevent_initial_call=True
+)
+def mostrar_ficha_becario(clicks):
+    if not ctx.triggered_id or not any(clicks):
+        return no_update
+    snap = obtener_snapshot()
+    version, fila = ctx.triggered_id["index"].rsplit(":", 1)
+    if version != snap.version:
+        return html.Div("Los datos se actualizaron, vuelve a buscar al becario.", style={'color': 'gray'})
+    return ficha_becario(snap, int(fila))
+
+# ================================
+#  LAYOUT PRINCIPAL
+# ================================
+def panel_cargando():
+    """Lo que se muestra mientras todavía no hay datos (o si la carga falló)"""
+    error = error_carga()
+    if error:
+        return dbc.Container([
+            dbc.Alert([
+                html.H4("No se pudieron cargar los datos de becarios", className="alert-heading"),
+                html.P(error),
+                html.P(f"Se reintentará automáticamente cada {REINTENTO_CARGA} segundos.", className="mb-0")
+            ], color="danger")
+        ])
+    return html.Div([
+        dbc.Spinner(color="primary"),
+        html.P("Cargando datos de becarios...", style={'color': '#888', 'marginTop': '15px'})
+    ], className="text-center", style={'padding': '80px 0'})
+
+def contenido_principal(snap):
+    return dbc.Container([
+        # KPIs Principales
+        html.Div([
+            html.H3("📈 Indicadores Clave", className="titulo-seccion", style={'color': COLORS['primary']})
+        ]),
+    
+        panel_filtros(snap),
+
+        dbc.Row(
+            tarjetas_kpi(snap.total_becarios, snap.mejoraron, snap.empeoraron, snap.se_mantuvieron),
+            id="kpis", className="mb-4"
+        ),
+
+        html.Hr(className="separador"),
+
+        # Gráficos principales
+        html.Div([
+            html.H3("📊 Análisis Visual", className="titulo-seccion", style={'color': COLORS['primary']})
+        ]),
+
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    grafico_en_layout(snap, "riesgo")
+                ], className="recuadro")
             ], lg=8, md=12),
             dbc.Col([
                 html.Div([
-                    html.H5("📋 Resumen por Período", style={
-                        'color': COLORS['primary'],
-                        'textAlign': 'center',
-                        'marginBottom': '20px'
-                    }),
-                    tabla_riesgo
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px',
-                    'height': '450px',
-                    'display': 'flex',
-                    'flexDirection': 'column',
-                    'justifyContent': 'center'
-                })
+                    html.H5("📋 Resumen por Período"),
+                    html.Div(snap.tabla_riesgo, id="tabla-riesgo")
+                ], className="recuadro recuadro-tabla")
             ], lg=4, md=12)
         ], className="mb-5"),
 
         dbc.Row([
             dbc.Col([
                 html.Div([
-                    dcc.Graph(figure=grafico_no_encontrado())
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+                    grafico_en_layout(snap, "transiciones")
+                ], className="recuadro")
+            ], lg=8, md=12),
+            dbc.Col([
+                html.Div([
+                    html.H5("🔀 Matriz de Transición"),
+                    html.Div(obtener_tabla_transicion(snap), id="tabla-transiciones")
+                ], className="recuadro recuadro-tabla")
+            ], lg=4, md=12)
+        ], className="mb-5"),
+
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    grafico_en_layout(snap, "no_encontrado")
+                ], className="recuadro")
             ], lg=12)
         ], className="mb-5"),
 
         # Análisis de estudiantes que empeoraron
         html.Div([
-            html.H3("🔍 Análisis Detallado - Estudiantes que Empeoraron", style={
-                'color': COLORS['danger'], 
-                'fontWeight': 'bold',
-                'marginBottom': '25px',
-                'textAlign': 'center'
-            })
+            html.H3("🔍 Análisis Detallado - Estudiantes que Empeoraron", className="titulo-seccion", style={'color': COLORS['danger']})
         ]),
 
         dbc.Row([
             dbc.Col([
                 html.Div([
-                    dcc.Graph(figure=grafico_empeoraron_por_modalidad())
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+                    grafico_en_layout(snap, "empeoraron_modalidad")
+                ], className="recuadro")
             ], lg=7, md=12),
             dbc.Col([
                 html.Div([
-                    dcc.Graph(figure=grafico_torta_riesgo_psicologico())
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+                    grafico_en_layout(snap, "riesgo_psicologico")
+                ], className="recuadro")
             ], lg=5, md=12)
         ], className="mb-5"),
 
         html.Div([
             html.H5([
                 html.I(className="fas fa-table", style={'marginRight': '10px'}),
-                "Distribución de Niveles por Modalidad (2025-2)"
-            ], style={
-                'color': COLORS['warning'],
-                'textAlign': 'center',
-                'fontWeight': 'bold',
-                'marginBottom': '25px'
-            })
+                "Distribución de Niveles por Modalidad (",
+                html.Span(snap.par[1], id="titulo-periodo-final"),
+                ")"
+            ], className="titulo-seccion", style={'color': COLORS['warning']})
         ]),
-        
+    
         dbc.Row([
             dbc.Col([
                 html.Div([
-                    tabla_modalidad_niveles_2025_2()
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '20px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+                    tabla_modalidad_en_layout(snap)
+                ], className="recuadro")
             ], lg=12)
         ], className="mb-5"),
 
-        html.Hr(style={'border': f'1px solid {COLORS["primary"]}', 'margin': '40px 0'}),
+        # Detalle por estudiante
+        html.Div([
+            html.H5([
+                html.I(className="fas fa-user-graduate", style={'marginRight': '10px'}),
+                "Detalle por Becario"
+            ], className="titulo-seccion", style={'color': COLORS['dark']})
+        ]),
+
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    panel_busqueda()
+                ], className="recuadro")
+            ], lg=12)
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    tabla_estudiantes(snap)
+                ], className="recuadro")
+            ], lg=12)
+        ], className="mb-5"),
+
+        html.Hr(className="separador"),
 
         # Sección de descarga mejorada
         dbc.Row([
@@ -1112,8 +2789,12 @@ app.layout = html.Div([
                         html.I(className="fas fa-download", style={'marginRight': '10px'}),
                         "Exportar Resultados"
                     ], style={'color': COLORS['primary'], 'textAlign': 'center'}),
-                    html.P("Descarga un archivo Excel con el análisis detallado por categoría de evolución", 
-                           style={'textAlign': 'center', 'color': '#666', 'marginBottom': '25px'}),
+                    html.P([
+                        "Descarga un archivo Excel con el análisis detallado por categoría de evolución",
+                        html.Br(),
+                        html.A("Enlace directo al archivo", href=app.get_relative_path(f"/descargas/{NOMBRE_EXCEL}"),
+                               style={'fontSize': '0.85rem'})
+                    ], className="texto-descarga"),
                     html.Div([
                         dbc.Button([
                             html.I(className="fas fa-file-excel", style={'marginRight': '8px'}),
@@ -1123,31 +2804,21 @@ app.layout = html.Div([
                         n_clicks=0, 
                         color="success", 
                         size="lg",
-                        style={
-                            'borderRadius': '25px',
-                            'padding': '12px 30px',
-                            'fontWeight': 'bold',
-                            'boxShadow': '0 4px 15px rgba(0,0,0,0.2)'
-                        })
+                        className="boton-descarga")
                     ], className="text-center"),
+                    # Avance de la exportación en segundo plano
+                    dbc.Progress(
+                        id="progreso-excel", value=0, striped=True, animated=True, color="success",
+                        style={'display': 'none'}
+                    ),
                     # Mensaje de estado
-                    html.Div(id="download-status", style={
-                        'textAlign': 'center', 
-                        'marginTop': '15px',
-                        'fontSize': '0.9rem'
-                    }),
+                    html.Div(id="download-status", className="estado-descarga"),
                     dcc.Download(id="download_excel")
-                ], style={
-                    'backgroundColor': 'white',
-                    'borderRadius': '15px',
-                    'padding': '30px',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.1)',
-                    'margin': '10px'
-                })
+                ], className="recuadro recuadro-descarga")
             ], lg=12)
         ]),
 
-        html.Hr(style={'margin': '40px 0'}),
+        html.Hr(className="separador-final"),
 
         # Footer
         html.Div([
@@ -1155,192 +2826,759 @@ app.layout = html.Div([
                 html.I(className="fas fa-chart-line", style={'marginRight': '8px'}),
                 "Dashboard de Análisis Académico | ",
                 html.Strong("Población: Becarios"),
-                " | Comparativa Riesgo Académico 2025-1 vs 2025-2"
-            ], style={
-                'textAlign': 'center', 
-                'color': '#888', 
-                'fontSize': '0.9rem',
-                'margin': '0'
-            })
-        ], style={'padding': '20px 0'})
+                f" | Comparativa Riesgo Académico {' · '.join(snap.periodos)}"
+            ])
+        ], className="pie-pagina")
 
     ], fluid=True)
-], style={
-    'backgroundColor': '#f8f9fa',
-    'minHeight': '100vh',
-    'fontFamily': 'Arial, sans-serif'
-})
 
-# ================================
-#  CALLBACK CORREGIDO PARA DESCARGA
-# ================================
+# Header con gradiente (también lo usa la versión estática, ver construir_estatico.py)
+def encabezado():
+    return html.Div([
+        html.Div([
+            html.H1([
+                html.I(className="fas fa-graduation-cap", style={'marginRight': '15px'}),
+                "Dashboard de Becarios 2025"
+            ], className="text-center encabezado-titulo"),
+            html.P("Análisis del Riesgo Académico", className="text-center encabezado-subtitulo")
+        ], className="encabezado-contenido")
+    ], className="encabezado")
+
+def layout_principal():
+    snap = obtener_snapshot()
+
+    return html.Div([
+        # Versión de los datos con la que se armó esta página
+        dcc.Store(id="version-datos", data=snap.version if snap is not None else None),
+        # Mientras no hay datos se consulta cada pocos segundos si ya llegaron
+        dcc.Interval(id="espera-datos", interval=2000, disabled=snap is not None),
+
+        encabezado(),
+
+        html.Div(
+            contenido_principal(snap) if snap is not None else panel_cargando(),
+            id="contenido-principal"
+        ),
+    ], className="pagina")
+
+app.layout = layout_principal
+
 @app.callback(
-    [Output("download_excel", "data"),
-     Output("download-status", "children")],
-    Input("btn_excel", "n_clicks"),
+    [Output("contenido-principal", "children"),
+     Output("version-datos", "data"),
+     Output("espera-datos", "disabled")],
+    Input("espera-datos", "n_intervals"),
     prevent_initial_call=True
 )
-def descargar_excel(n_clicks):
+def esperar_datos(_n_intervals):
+    snap = obtener_snapshot()
+    if snap is None:
+        return panel_cargando(), no_update, False
+    return contenido_principal(snap), snap.version, True
+
+# ================================
+#  EXPORTACIÓN A EXCEL (CACHE POR VERSIÓN)
+# ================================
+# Colores para cada tipo de hoja; {inicial} y {final} son los períodos exportados
+COLORES_HOJAS = {
+    "Mejoraron": "28A745",           # Verde
+    "Empeoraron": "DC3545",          # Rojo
+    "Se Mantuvieron": "6C757D",      # Gris
+    "Solo Riesgo {inicial}": "FFC107", # Amarillo
+    "Solo Riesgo {final}": "17A2B8", # Azul claro
+    "Sin Informacion": "6F42C1",     # Púrpura
+    "Resumen General": "2E86AB"      # Azul principal
+}
+
+def par_exportacion(df_becarios):
+    """La exportación compara los dos últimos períodos, los mismos de la columna EVOLUCION"""
+    return par_por_defecto(periodos_becarios(df_becarios))
+
+# Filas que se convierten a la vez al escribir; acota la memoria usada
+FILAS_POR_BLOQUE = 10000
+
+def segmentos_exportacion(df_becarios):
+    """
+    Filas de cada hoja de la exportación, en orden: por categoría de evolución
+    y por disponibilidad de datos de riesgo
+    """
+    inicial, final = par_exportacion(df_becarios)
+    riesgo_inicial = df_becarios[columna_riesgo(inicial)]
+    riesgo_final = df_becarios[columna_riesgo(final)]
+
+    # HOJAS EXISTENTES - Crear DataFrames para cada categoría de evolución
+    df_mejoraron = df_becarios[df_becarios["EVOLUCION"] == "MEJORO"]
+    df_empeoraron = df_becarios[df_becarios["EVOLUCION"] == "EMPEORO"]
+    df_se_mantuvieron = df_becarios[
+        mascara_se_mantuvieron(df_becarios, columna_riesgo(inicial), columna_riesgo(final))
+    ]
+    
+    # NUEVAS HOJAS - Crear DataFrames por disponibilidad de datos de riesgo
+    
+    # 1. Estudiantes con riesgo SOLO en el período inicial (tienen datos en el inicial, NO en el final)
+    df_solo_inicial = df_becarios[
+        (riesgo_inicial.isin(["ALTO", "MEDIO", "BAJO"])) &
+        (riesgo_final == "NO ENCONTRADO")
+    ]
+    
+    # 2. Estudiantes con riesgo SOLO en el período final (tienen datos en el final, NO en el inicial)
+    df_solo_final = df_becarios[
+        (riesgo_inicial == "NO ENCONTRADO") &
+        (riesgo_final.isin(["ALTO", "MEDIO", "BAJO"]))
+    ]
+    
+    # 3. Estudiantes SIN información de riesgo en NINGUNO de los dos períodos
+    df_sin_informacion = df_becarios[
+        (riesgo_inicial == "NO ENCONTRADO") &
+        (riesgo_final == "NO ENCONTRADO")
+    ]
+
+    return [
+        ("Mejoraron", df_mejoraron),
+        ("Empeoraron", df_empeoraron),
+        ("Se Mantuvieron", df_se_mantuvieron),
+        (f"Solo Riesgo {inicial}", df_solo_inicial),
+        (f"Solo Riesgo {final}", df_solo_final),
+        ("Sin Informacion", df_sin_informacion),
+    ]
+
+def resumen_exportacion(segmentos, total, par):
+    """Hoja de resumen ampliada a partir de los segmentos"""
+    inicial, final = par
+    cantidades = [len(df) for _, df in segmentos]
+    return pd.DataFrame({
+        'CATEGORIA': [
+            'MEJORARON', 
+            'EMPEORARON', 
+            'SE MANTUVIERON',
+            f'SOLO TIENEN RIESGO {inicial}',
+            f'SOLO TIENEN RIESGO {final}', 
+            'SIN INFORMACIÓN AMBOS PERÍODOS',
+            'TOTAL BECARIOS'
+        ],
+        'CANTIDAD': cantidades + [total],
+        'PORCENTAJE': [
+            f"{cantidad/total*100:.1f}%" if total > 0 else "0.0%" for cantidad in cantidades
+        ] + ["100.0%"],
+        'DESCRIPCION': [
+            'Estudiantes que redujeron su nivel de riesgo',
+            'Estudiantes que aumentaron su nivel de riesgo',
+            'Estudiantes que mantuvieron el mismo nivel',
+            f'Solo aparecen en registro {inicial}',
+            f'Solo aparecen en registro {final}', 
+            'No tienen datos de riesgo en ningún período',
+            'Total de becarios en la base de datos'
+        ]
+    })
+
+def hojas_exportacion(df_becarios):
+    """Hojas no vacías del Excel, en orden, incluida la hoja de resumen"""
+    segmentos = segmentos_exportacion(df_becarios)
+    hojas = [(nombre, df) for nombre, df in segmentos if not df.empty]
+    hojas.append(("Resumen General", resumen_exportacion(segmentos, len(df_becarios), par_exportacion(df_becarios))))
+    return hojas
+
+def anchos_columnas(df):
+    """
+    Ancho de cada columna según el texto más largo (encabezado incluido),
+    calculado sobre el DataFrame y no celda por celda. Las celdas vacías
+    cuentan como texto vacío (con pandas 3, astype(str) las deja como NaN)
+    """
+    anchos = []
+    for col in df.columns:
+        largo = len(str(col))
+        if not df.empty:
+            largo = max(largo, int(df[col].astype(str).str.len().fillna(0).max()))
+        anchos.append(max(min(largo + 2, 50), 12))
+    return anchos
+
+def filas_excel(df):
+    """Filas del DataFrame como tuplas, con celdas vacías en lugar de NaN"""
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE].astype(object)
+        bloque = bloque.where(bloque.notna(), None)
+        yield from bloque.itertuples(index=False, name=None)
+
+def generar_excel(df_becarios, destino, avance=None):
+    """
+    Escribe el Excel completo de análisis en destino, en modo de solo
+    escritura: las filas se vuelcan a disco a medida que se agregan.
+    avance(porcentaje, texto) se llama al terminar cada hoja.
+    Devuelve el número de hojas
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    hojas = hojas_exportacion(df_becarios)
+    inicial, final = par_exportacion(df_becarios)
+    colores = {nombre.format(inicial=inicial, final=final): color for nombre, color in COLORES_HOJAS.items()}
+
+    for numero, (sheet_name, df) in enumerate(hojas, start=1):
+        worksheet = workbook.create_sheet(sheet_name)
+        color_hex = colores.get(sheet_name, "2E86AB")
+
+        # Ajustar anchos de columnas (antes de escribir filas)
+        for i, ancho in enumerate(anchos_columnas(df), start=1):
+            worksheet.column_dimensions[get_column_letter(i)].width = ancho
+
+        # Formatear encabezados
+        header_fill = PatternFill(start_color=color_hex, end_color=color_hex, fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF", size=12)
+        header_alignment = Alignment(horizontal="center", vertical="center")
+
+        encabezados = []
+        for col in df.columns:
+            cell = WriteOnlyCell(worksheet, value=str(col))
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = header_alignment
+            encabezados.append(cell)
+        worksheet.append(encabezados)
+
+        for fila in filas_excel(df):
+            worksheet.append(fila)
+        if avance:
+            avance(10 + 85 * numero // len(hojas), f"Hoja {numero} de {len(hojas)}: {sheet_name}")
+
+    workbook.save(destino)
+    return len(hojas)
+
+def columnas_derivadas(snap):
+    """Columnas calculadas (y las de hojas auxiliares) que se agregan a las filas completas al exportar"""
+    return [columna_riesgo(periodo) for periodo in snap.periodos] + ["EVOLUCION"] + columnas_auxiliares(snap.df_becarios)
+
+def ruta_parquet_completo(snap):
+    return os.path.join(CACHE_DIR, f"completo_{clave_datos(snap.version)}.parquet")
+
+def ruta_completo(snap):
+    """
+    Parquet con todas las columnas de la fuente más las derivadas. Se arma
+    una vez por versión al primer uso y se lee de disco en cada exportación,
+    así las filas completas no quedan en memoria
+    """
+    def construir():
+        ruta = ruta_parquet_completo(snap)
+        if os.path.exists(ruta):
+            return ruta
+        if not snap.fuente or not os.path.exists(snap.fuente):
+            print("Fuente original no disponible: se exportan solo las columnas del dashboard")
+            return None
+
+        with medir("lectura_completa"):
+            df = leer_becarios(snap.fuente, completo=True)
+        for col in columnas_derivadas(snap):
+            df[col] = snap.df_becarios[col].to_numpy(dtype=object)
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+        limpiar_cache("completo_", ".parquet", conservar=rutas_en_uso(ruta_parquet_completo, snap))
+        return ruta
+
+    return memoizar(snap, "completo", construir)
+
+def df_completo(snap):
+    ruta = ruta_completo(snap)
+    return pd.read_parquet(ruta) if ruta else snap.df_becarios
+
+@contextmanager
+def candado_archivo(ruta):
+    """
+    Exclusión entre procesos (workers de gunicorn y tareas en segundo
+    plano): solo uno a la vez entra con el mismo archivo de candado
+    """
+    with open(ruta, "a") as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+def ruta_excel(snap):
+    return os.path.join(CACHE_DIR, f"export_{clave_datos(snap.version)}.xlsx")
+
+def rutas_en_uso(ruta_de, snap):
+    """
+    La ruta de snap y la del snapshot publicado: mientras snap se precalienta,
+    el anterior sigue sirviendo sus archivos y no se pueden borrar
+    """
+    return {ruta_de(s) for s in (snap, obtener_snapshot()) if s is not None}
+
+def limpiar_exportaciones(snap):
+    """Ya publicado snap, borra los archivos de exportación de versiones anteriores"""
+    limpiar_cache("completo_", ".parquet", conservar=ruta_parquet_completo(snap))
+    limpiar_cache("export_", ".xlsx", conservar=ruta_excel(snap))
+    limpiar_cache("export_", ".lock", conservar=f"{ruta_excel(snap)}.lock")
+
+def obtener_excel(snap, avance=None):
+    """
+    Ruta del Excel de este snapshot y su número de hojas. El archivo solo
+    cambia cuando cambian los datos: se genera una vez por versión y queda
+    en disco, así no ocupa memoria entre descargas. Si otro proceso ya lo
+    está generando, se espera a ese en vez de generarlo otra vez
+    """
+    def construir():
+        ruta = ruta_excel(snap)
+        if os.path.exists(ruta):
+            return ruta, len(hojas_exportacion(snap.df_becarios))
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with candado_archivo(f"{ruta}.lock"):
+            if os.path.exists(ruta):
+                return ruta, len(hojas_exportacion(snap.df_becarios))
+            if avance:
+                avance(5, "Leyendo las filas completas")
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with medir("excel"):
+                n_hojas = generar_excel(df_completo(snap), temporal, avance)
+            os.replace(temporal, ruta)
+        vigentes = rutas_en_uso(ruta_excel, snap)
+        limpiar_cache("export_", ".xlsx", conservar=vigentes)
+        limpiar_cache("export_", ".lock", conservar=[f"{r}.lock" for r in vigentes])
+        return ruta, n_hojas
+
+    return memoizar(snap, "excel", construir)
+
+def respuesta_sin_datos():
+    return Response(
+        "Los datos de becarios todavía no están disponibles", status=503,
+        headers={"Retry-After": str(REINTENTO_CARGA)}
+    )
+
+@app.server.route(f"/descargas/{NOMBRE_EXCEL}")
+def servir_excel():
+    snap = obtener_snapshot()
+    if snap is None:
+        return respuesta_sin_datos()
+
+    # Si el navegador ya tiene esta versión, no hace falta enviar nada
+    etiqueta = clave_datos(snap.version)
+    if request.if_none_match.contains(etiqueta):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etiqueta)
+        return respuesta
+
+    ruta, _ = obtener_excel(snap)
+    respuesta = send_file(
+        ruta, mimetype=MIME_XLSX, as_attachment=True,
+        download_name=NOMBRE_EXCEL, etag=etiqueta
+    )
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+# ================================
+#  EXPORTACIÓN MASIVA (CSV EN ZIP / PARQUET)
+# ================================
+# Para procesos automáticos: los mismos segmentos que el Excel, sin estilos,
+# generados por partes y enviados en streaming.
+NOMBRE_EXPORTACION = "analisis_becarios_2025"
+
+class FlujoSalida(io.RawIOBase):
+    """
+    Destino de escritura que acumula lo escrito hasta que se retira con
+    vaciar(). No admite seek, así zip y Parquet escriben hacia adelante
+    """
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+def segmentos_con_resumen(df_becarios):
+    """Los seis segmentos (incluso vacíos) más la hoja de resumen"""
+    segmentos = segmentos_exportacion(df_becarios)
+    resumen = resumen_exportacion(segmentos, len(df_becarios), par_exportacion(df_becarios))
+    return segmentos + [("Resumen General", resumen)]
+
+def generar_zip_csv(df_becarios):
+    """Zip con un CSV por segmento, entregado por bloques de filas"""
+    salida = FlujoSalida()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, df in segmentos_con_resumen(df_becarios):
+            with archivo.open(f"{nombre}.csv", "w", force_zip64=True) as csv:
+                # range(0, 1) para escribir al menos el encabezado de un segmento vacío
+                for inicio in range(0, max(len(df), 1), FILAS_POR_BLOQUE):
+                    bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE]
+                    csv.write(bloque.to_csv(index=False, header=inicio == 0).encode("utf-8"))
+                    yield salida.vaciar()
+    yield salida.vaciar()
+
+def generar_parquet(df_becarios):
+    """
+    Un solo Parquet con las filas de los seis segmentos y la columna SEGMENTO.
+    El resumen general va en los metadatos del archivo (clave "resumen")
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    *segmentos, (_, resumen) = segmentos_con_resumen(df_becarios)
+
+    esquema = pa.Schema.from_pandas(df_becarios, preserve_index=False)
+    esquema = esquema.append(pa.field("SEGMENTO", pa.string()))
+    esquema = esquema.with_metadata({"resumen": resumen.to_json(orient="records", force_ascii=False)})
+
+    salida = FlujoSalida()
+    escritor = pq.ParquetWriter(salida, esquema)
+    for nombre, df in segmentos:
+        for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+            bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE].assign(SEGMENTO=nombre)
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+            yield salida.vaciar()
+    escritor.close()
+    yield salida.vaciar()
+
+FORMATOS_EXPORTACION = {
+    "csv.zip": (generar_zip_csv, "application/zip"),
+    "parquet": (generar_parquet, "application/vnd.apache.parquet"),
+}
+
+@app.server.route(f"/exportar/{NOMBRE_EXPORTACION}.<path:formato>")
+def exportar_segmentos(formato):
+    if formato not in FORMATOS_EXPORTACION:
+        return Response(f"Formato no disponible: {formato}", status=404)
+
+    snap = obtener_snapshot()
+    if snap is None:
+        return respuesta_sin_datos()
+    etiqueta = clave_datos(snap.version)
+    if request.if_none_match.contains(etiqueta):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etiqueta)
+        return respuesta
+
+    generar, mimetype = FORMATOS_EXPORTACION[formato]
+    respuesta = Response(generar(df_completo(snap)), mimetype=mimetype)
+    respuesta.set_etag(etiqueta)
+    respuesta.headers["Content-Disposition"] = f'attachment; filename="{NOMBRE_EXPORTACION}.{formato}"'
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+# ================================
+#  MÉTRICAS Y DISPONIBILIDAD
+# ================================
+# Cada petición se mide por ruta; las de Dash a _dash-update-component llevan
+# además el callback (sus outputs), así se ve cuánto tarda cada gráfico,
+# tabla o descarga. La serialización del layout queda en la ruta _dash-layout.
+@app.server.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+
+@app.server.after_request
+def registrar_medicion(respuesta):
+    inicio = g.pop("inicio_peticion", None)
+    if inicio is None:
+        return respuesta
+
+    etiquetas = {"ruta": request.url_rule.rule if request.url_rule else "sin_ruta"}
+    if request.path.endswith("/_dash-update-component"):
+        cuerpo = request.get_json(silent=True) or {}
+        etiquetas["callback"] = cuerpo.get("output", "desconocido")
+
+    observar("becarios_peticion_segundos", time.perf_counter() - inicio, **etiquetas)
+    if respuesta.status_code >= 500:
+        incrementar("becarios_peticion_errores_total", **etiquetas)
+    return respuesta
+
+@app.server.route("/metrics")
+def metricas():
+    lineas = texto_metricas()
+    snap = obtener_snapshot()
+    lineas += [
+        "# HELP becarios_datos_disponibles 1 si hay datos cargados, 0 mientras carga o si la carga falló",
+        "# TYPE becarios_datos_disponibles gauge",
+        f"becarios_datos_disponibles {int(snap is not None)}",
+    ]
+    if snap is not None:
+        lineas += [
+            "# HELP becarios_datos_cargados_timestamp_segundos Momento (epoch) en que se cargó el snapshot actual",
+            "# TYPE becarios_datos_cargados_timestamp_segundos gauge",
+            f"becarios_datos_cargados_timestamp_segundos {snap.cargado_en}",
+            "# HELP becarios_filas Becarios en el snapshot actual",
+            "# TYPE becarios_filas gauge",
+            f"becarios_filas {len(snap.df_becarios)}",
+            "# HELP becarios_datos_info Versión de los datos cargados",
+            "# TYPE becarios_datos_info gauge",
+            f"becarios_datos_info{formato_etiquetas((('version', snap.version),))} 1",
+            "# HELP becarios_memoria_bytes Bytes por columna de df_becarios (antes: como texto object)",
+            "# TYPE becarios_memoria_bytes gauge",
+        ]
+        for fila in obtener_reporte_memoria(snap).itertuples(index=False):
+            for representacion, valor in (("antes", fila.BYTES_ANTES), ("ahora", fila.BYTES_AHORA)):
+                etiquetas = formato_etiquetas((("columna", fila.COLUMNA), ("representacion", representacion)))
+                lineas.append(f"becarios_memoria_bytes{etiquetas} {valor}")
+    return Response("\n".join(lineas) + "\n", mimetype="text/plain; version=0.0.4")
+
+@app.server.route("/ready")
+def disponibilidad():
+    snap = obtener_snapshot()
+    if snap is None:
+        error = error_carga()
+        return jsonify(estado="error" if error else "cargando", error=error), 503
+    return jsonify(
+        estado="listo",
+        version=snap.version,
+        filas=len(snap.df_becarios),
+        cargado_en=snap.cargado_en,
+    )
+
+# ================================
+#  RESPUESTAS JSON CACHEADAS Y COMPRIMIDAS
+# ================================
+# El layout y las respuestas de los callbacks de gráficos, tabla y KPIs solo
+# dependen de la versión de datos y de los filtros, así que su JSON se guarda
+# por snapshot (junto con sus versiones comprimidas) y se sirve sin volver a
+# ejecutar ni serializar nada. Las demás respuestas JSON se comprimen al vuelo.
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli se usa gzip
+    brotli = None
+
+MIN_BYTES_COMPRESION = 1024
+SALIDAS_CACHEABLES = (
+    {f"grafico-{nombre}.figure" for nombre in CONSTRUCTORES_FIGURAS}
+    | {
+        "..tabla-modalidad.children...titulo-periodo-final.children..", "kpis.children",
+        "tabla-riesgo.children", "tabla-transiciones.children",
+    }
+)
+
+def codificacion_preferida(cuerpo):
+    if len(cuerpo) < MIN_BYTES_COMPRESION:
+        return "identity"
+    aceptadas = {}
+    for parte in request.headers.get("Accept-Encoding", "").split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = parametros.strip().removeprefix("q=") if parametros else "1"
+        try:
+            aceptadas[nombre.strip().lower()] = float(calidad)
+        except ValueError:
+            pass
+    if brotli is not None and aceptadas.get("br", 0) > 0:
+        return "br"
+    if aceptadas.get("gzip", 0) > 0:
+        return "gzip"
+    return "identity"
+
+def comprimir(cuerpo, codificacion):
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=5)
+    if codificacion == "gzip":
+        return gzip.compress(cuerpo, compresslevel=6, mtime=0)
+    return cuerpo
+
+def clave_respuesta():
+    """Clave de cache de la petición actual (None si no se cachea)"""
+    if request.method == "GET" and request.path.endswith("/_dash-layout"):
+        return ("respuesta", "layout")
+    if request.method == "POST" and request.path.endswith("/_dash-update-component"):
+        cuerpo = request.get_json(silent=True) or {}
+        if cuerpo.get("output") in SALIDAS_CACHEABLES:
+            return ("respuesta", hashlib.sha256(request.get_data()).hexdigest())
+    return None
+
+def variante(cacheada, codificacion):
+    """Cuerpo de una respuesta cacheada en la codificación pedida (se comprime una sola vez)"""
+    if codificacion not in cacheada:
+        cacheada[codificacion] = comprimir(cacheada["identity"], codificacion)
+    return cacheada[codificacion]
+
+def etiqueta_variante(cacheada, codificacion):
+    # Cada codificación es una representación distinta y lleva su propio ETag
+    return cacheada["etiqueta"] if codificacion == "identity" else f"{cacheada['etiqueta']}-{codificacion}"
+
+def preparar_respuesta(respuesta, cuerpo, codificacion, etiqueta=None):
+    respuesta.set_data(cuerpo)
+    respuesta.vary.add("Accept-Encoding")
+    if codificacion != "identity":
+        respuesta.headers["Content-Encoding"] = codificacion
+    if etiqueta and request.method == "GET":
+        respuesta.set_etag(etiqueta)
+        respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+@app.server.before_request
+def servir_respuesta_cacheada():
+    clave = clave_respuesta()
+    snap = obtener_snapshot()
+    if clave is None or snap is None:
+        return None
+
+    with snap.lock:
+        cacheada = snap.vistas.get(clave)
+        if cacheada is not None:
+            snap.vistas.move_to_end(clave)
+    if cacheada is None:
+        g.respuesta_por_cachear = (snap, clave)
+        return None
+
+    codificacion = codificacion_preferida(cacheada["identity"])
+    etiqueta = etiqueta_variante(cacheada, codificacion)
+    if request.method == "GET" and request.if_none_match.contains_weak(etiqueta):
+        return preparar_respuesta(Response(status=304), b"", "identity", etiqueta)
+    return preparar_respuesta(
+        Response(mimetype="application/json"), variante(cacheada, codificacion), codificacion, etiqueta
+    )
+
+@app.server.after_request
+def comprimir_respuesta(respuesta):
+    por_cachear = g.pop("respuesta_por_cachear", None)
+    if respuesta.direct_passthrough or respuesta.is_streamed or respuesta.mimetype != "application/json":
+        return respuesta
+    if respuesta.status_code != 200 or "Content-Encoding" in respuesta.headers:
+        return respuesta
+
+    cuerpo = respuesta.get_data()
+    codificacion = codificacion_preferida(cuerpo)
+
+    snap, clave = por_cachear or (None, None)
+    if snap is None or snap is not obtener_snapshot():
+        return preparar_respuesta(respuesta, comprimir(cuerpo, codificacion), codificacion)
+
+    cacheada = {"identity": cuerpo, "etiqueta": hashlib.sha256(cuerpo).hexdigest()[:16]}
+    guardar_vista(snap, clave, cacheada)
+    return preparar_respuesta(
+        respuesta, variante(cacheada, codificacion), codificacion, etiqueta_variante(cacheada, codificacion)
+    )
+
+# ================================
+#  CALLBACK CORREGIDO PARA DESCARGA (EN SEGUNDO PLANO)
+# ================================
+# Con diskcache instalado la exportación corre como background callback de
+# Dash: el worker de gunicorn solo lanza la tarea (un proceso aparte) y el
+# navegador consulta su avance, así una exportación grande no ocupa un
+# worker ni choca con su timeout. A lo sumo MAX_EXPORTACIONES tareas
+# generan a la vez; las demás esperan turno, y las que piden la misma versión
+# esperan al archivo que ya se está generando (ver obtener_excel). Sin
+# diskcache, el callback es síncrono como antes.
+MAX_EXPORTACIONES = int(os.environ.get("BECARIOS_MAX_EXPORTACIONES", "2"))
+DIRECTORIO_TAREAS = os.path.join(CACHE_DIR, "tareas")
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:
+    DiskcacheManager = None
+
+if DiskcacheManager:
+    class AdministradorTareas(DiskcacheManager):
+        """
+        DiskcacheManager que no hace fork mientras otro hilo del servidor usa
+        la base sqlite de diskcache (consultando el avance de otra tarea): el
+        proceso hijo heredaría el mutex interno de sqlite tomado y se colgaría
+        en su primer set_progress
+        """
+        _candado = threading.RLock()
+
+        def _serializado(metodo):
+            def envoltura(self, *args, **kwargs):
+                with self._candado:
+                    return metodo(self, *args, **kwargs)
+            return envoltura
+
+        for _nombre in ("call_job_fn", "get_progress", "result_ready", "get_result",
+                        "get_updated_props", "clear_cache_entry", "terminate_job",
+                        "get_or_create_signing_secret"):
+            locals()[_nombre] = _serializado(getattr(DiskcacheManager, _nombre))
+        del _nombre, _serializado
+
+    def version_exportacion():
+        snap = obtener_snapshot()
+        return clave_datos(snap.version) if snap is not None else ""
+
+    # Dash arma la clave de la tarea con los argumentos del callback, así que
+    # dos usuarios con el mismo n_clicks comparten clave: sin cache_by el
+    # primero en leer el resultado lo borra y el otro se queda esperando. Con
+    # la versión de los datos en la clave el archivo (en base64) se reutiliza
+    # entre usuarios y se descarta a los 10 minutos
+    ADMINISTRADOR_TAREAS = AdministradorTareas(
+        diskcache.Cache(DIRECTORIO_TAREAS), cache_by=[version_exportacion], expire=600
+    )
+else:
+    ADMINISTRADOR_TAREAS = None
+
+def reiniciar_candados():
+    """
+    En el proceso de la tarea (fork) solo sobrevive el hilo que hizo el
+    fork: un candado que otro hilo tenía tomado (p. ej. el refresco
+    precalentando) quedaría cerrado para siempre, así que se crean de nuevo
+    """
+    global _candado_metricas
+    _candado_metricas = threading.Lock()
+    if ADMINISTRADOR_TAREAS:
+        AdministradorTareas._candado = threading.RLock()
+    snap = obtener_snapshot()
+    if snap is not None:
+        object.__setattr__(snap, "lock", threading.Lock())
+        snap.candados.clear()
+
+os.register_at_fork(after_in_child=reiniciar_candados)
+
+@contextmanager
+def turno_exportacion(esperando=None):
+    """
+    Uno de los MAX_EXPORTACIONES turnos de exportación, compartidos entre
+    procesos. Mientras todos estén ocupados se llama a esperando() y se reintenta
+    """
+    os.makedirs(DIRECTORIO_TAREAS, exist_ok=True)
+    while True:
+        for numero in range(MAX_EXPORTACIONES):
+            archivo = open(os.path.join(DIRECTORIO_TAREAS, f"turno_{numero}.lock"), "a")
+            try:
+                fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                archivo.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+                archivo.close()
+            return
+        if esperando:
+            esperando()
+        time.sleep(0.5)
+
+def exportar_excel(n_clicks, avance=None):
     if n_clicks == 0:
         return None, ""
     
     try:
-        # HOJAS EXISTENTES - Crear DataFrames para cada categoría de evolución
-        df_mejoraron = df_becarios[df_becarios["EVOLUCION"] == "MEJORO"].copy()
-        df_empeoraron = df_becarios[df_becarios["EVOLUCION"] == "EMPEORO"].copy()
-        df_se_mantuvieron = df_becarios[
-            (df_becarios["EVOLUCION"] == "SE MANTUVO") &
-            (df_becarios["RIESGO_2025_1"] != "NO ENCONTRADO") &
-            (df_becarios["RIESGO_2025_2"] != "NO ENCONTRADO")
-        ].copy()
-        
-        # NUEVAS HOJAS - Crear DataFrames por disponibilidad de datos de riesgo
-        
-        # 1. Estudiantes con riesgo SOLO en 2025-1 (tienen datos en 2025-1, NO en 2025-2)
-        df_solo_2025_1 = df_becarios[
-            (df_becarios["RIESGO_2025_1"].isin(["ALTO", "MEDIO", "BAJO"])) &
-            (df_becarios["RIESGO_2025_2"] == "NO ENCONTRADO")
-        ].copy()
-        
-        # 2. Estudiantes con riesgo SOLO en 2025-2 (tienen datos en 2025-2, NO en 2025-1)  
-        df_solo_2025_2 = df_becarios[
-            (df_becarios["RIESGO_2025_1"] == "NO ENCONTRADO") &
-            (df_becarios["RIESGO_2025_2"].isin(["ALTO", "MEDIO", "BAJO"]))
-        ].copy()
-        
-        # 3. Estudiantes SIN información de riesgo en NINGÚN período
-        df_sin_informacion = df_becarios[
-            (df_becarios["RIESGO_2025_1"] == "NO ENCONTRADO") &
-            (df_becarios["RIESGO_2025_2"] == "NO ENCONTRADO")
-        ].copy()
-        
-        # Crear buffer en memoria
-        output = io.BytesIO()
-        
-        # Usar openpyxl para crear el archivo Excel
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            
-            # HOJAS PRINCIPALES (por evolución)
-            if not df_mejoraron.empty:
-                df_mejoraron.to_excel(writer, sheet_name="Mejoraron", index=False)
-            
-            if not df_empeoraron.empty:
-                df_empeoraron.to_excel(writer, sheet_name="Empeoraron", index=False)
-            
-            if not df_se_mantuvieron.empty:
-                df_se_mantuvieron.to_excel(writer, sheet_name="Se Mantuvieron", index=False)
-            
-            # NUEVAS HOJAS (por disponibilidad de datos)
-            if not df_solo_2025_1.empty:
-                df_solo_2025_1.to_excel(writer, sheet_name="Solo Riesgo 2025-1", index=False)
-            
-            if not df_solo_2025_2.empty:
-                df_solo_2025_2.to_excel(writer, sheet_name="Solo Riesgo 2025-2", index=False)
-            
-            if not df_sin_informacion.empty:
-                df_sin_informacion.to_excel(writer, sheet_name="Sin Informacion", index=False)
-            
-            # HOJA DE RESUMEN AMPLIADA
-            df_resumen = pd.DataFrame({
-                'CATEGORIA': [
-                    'MEJORARON', 
-                    'EMPEORARON', 
-                    'SE MANTUVIERON',
-                    'SOLO TIENEN RIESGO 2025-1',
-                    'SOLO TIENEN RIESGO 2025-2', 
-                    'SIN INFORMACIÓN AMBOS PERÍODOS',
-                    'TOTAL BECARIOS'
-                ],
-                'CANTIDAD': [
-                    len(df_mejoraron), 
-                    len(df_empeoraron), 
-                    len(df_se_mantuvieron),
-                    len(df_solo_2025_1),
-                    len(df_solo_2025_2),
-                    len(df_sin_informacion),
-                    len(df_becarios)
-                ],
-                'PORCENTAJE': [
-                    f"{len(df_mejoraron)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%",
-                    f"{len(df_empeoraron)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%", 
-                    f"{len(df_se_mantuvieron)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%",
-                    f"{len(df_solo_2025_1)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%",
-                    f"{len(df_solo_2025_2)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%",
-                    f"{len(df_sin_informacion)/len(df_becarios)*100:.1f}%" if len(df_becarios) > 0 else "0.0%",
-                    "100.0%"
-                ],
-                'DESCRIPCION': [
-                    'Estudiantes que redujeron su nivel de riesgo',
-                    'Estudiantes que aumentaron su nivel de riesgo',
-                    'Estudiantes que mantuvieron el mismo nivel',
-                    'Solo aparecen en registro 2025-1',
-                    'Solo aparecen en registro 2025-2', 
-                    'No tienen datos de riesgo en ningún período',
-                    'Total de becarios en la base de datos'
-                ]
-            })
-            
-            df_resumen.to_excel(writer, sheet_name="Resumen General", index=False)
-            
-            # Formateo con openpyxl (si está disponible)
-            try:
-                from openpyxl.styles import Font, PatternFill, Alignment
-                
-                # Colores para cada tipo de hoja
-                colores_hojas = {
-                    "Mejoraron": "28A745",           # Verde
-                    "Empeoraron": "DC3545",          # Rojo
-                    "Se Mantuvieron": "6C757D",      # Gris
-                    "Solo Riesgo 2025-1": "FFC107", # Amarillo
-                    "Solo Riesgo 2025-2": "17A2B8", # Azul claro
-                    "Sin Informacion": "6F42C1",     # Púrpura
-                    "Resumen General": "2E86AB"      # Azul principal
-                }
-                
-                # Aplicar formato a cada hoja
-                for sheet_name in writer.sheets:
-                    worksheet = writer.sheets[sheet_name]
-                    color_hex = colores_hojas.get(sheet_name, "2E86AB")
-                    
-                    # Formatear encabezados
-                    header_fill = PatternFill(start_color=color_hex, end_color=color_hex, fill_type="solid")
-                    header_font = Font(bold=True, color="FFFFFF", size=12)
-                    header_alignment = Alignment(horizontal="center", vertical="center")
-                    
-                    # Aplicar formato a la primera fila
-                    for cell in worksheet[1]:
-                        cell.fill = header_fill
-                        cell.font = header_font
-                        cell.alignment = header_alignment
-                    
-                    # Ajustar anchos de columnas
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = max(adjusted_width, 12)
-                        
-            except ImportError:
-                # Continuar sin formato si openpyxl.styles no está disponible
-                pass
-        
-        # Preparar archivo para descarga
-        output.seek(0)
+        snap = obtener_snapshot()
+        if os.path.exists(ruta_excel(snap)):
+            ruta, n_hojas = obtener_excel(snap)
+        else:
+            esperando = (lambda: avance(0, "En cola: hay otras exportaciones en curso")) if avance else None
+            with turno_exportacion(esperando):
+                ruta, n_hojas = obtener_excel(snap, avance)
+        if avance:
+            avance(100, "Enviando el archivo")
         
-        return dcc.send_bytes(
-            output.getvalue(), 
-            filename="analisis_completo_becarios_2025.xlsx"
+        return dcc.send_file(
+            ruta, 
+            filename=NOMBRE_EXCEL
         ), html.Div([
             html.I(className="fas fa-check-circle", style={'color': 'green', 'marginRight': '5px'}),
-            f"¡Excel generado con {len(writer.sheets)} hojas!"
+            f"¡Excel generado con {n_hojas} hojas!"
         ])
         
     except Exception as e:
@@ -1350,11 +3588,46 @@ def descargar_excel(n_clicks):
             f"Error al generar el archivo: {str(e)}"
         ])
 
+SALIDAS_DESCARGA = [Output("download_excel", "data"), Output("download-status", "children")]
+
+if ADMINISTRADOR_TAREAS:
+    @app.callback(
+        SALIDAS_DESCARGA,
+        Input("btn_excel", "n_clicks"),
+        background=True,
+        manager=ADMINISTRADOR_TAREAS,
+        progress=[Output("progreso-excel", "value"), Output("progreso-excel", "label")],
+        running=[
+            (Output("btn_excel", "disabled"), True, False),
+            (Output("progreso-excel", "style"), {'display': 'flex', 'marginTop': '15px'}, {'display': 'none'}),
+        ],
+        prevent_initial_call=True
+    )
+    def descargar_excel(set_progress, n_clicks):
+        return exportar_excel(n_clicks, lambda porcentaje, texto: set_progress((porcentaje, texto)))
+else:
+    @app.callback(
+        SALIDAS_DESCARGA,
+        Input("btn_excel", "n_clicks"),
+        prevent_initial_call=True
+    )
+    def descargar_excel(n_clicks):
+        return exportar_excel(n_clicks)
+
 # ================================
 #  CONFIGURACIÓN PARA RENDER
 # ================================
 server = app.server
 
+# Con gunicorn --preload (ver gunicorn.conf.py) este módulo se importa una sola
+# vez en el proceso maestro y los workers heredan los datos por fork
+# (copy-on-write). En ese modo se deja todo calculado antes del fork y el
+# refresco lo arranca cada worker en post_fork: un hilo no sobrevive al fork.
+# Con preload el maestro no carga al importar: arranca enseguida y la
+# primera carga llega como cualquier cambio de la fuente (ver _vigilar_fuente)
+if CARGA_AUTOMATICA and not MODO_PRELOAD:
+    iniciar_refresco()
+
 # Configuración adicional para Render
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8050))
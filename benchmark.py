@@ -0,0 +1,206 @@
+"""
+Benchmark del pipeline de app.py sobre libros BECARIOS sintéticos.
+
+Para cada tamaño mide el tiempo (mejor de N repeticiones) y el pico de
+memoria (tracemalloc, en una corrida aparte) de cada etapa: lectura del
+libro (proyectado y completo), clasificación, cubo, snapshot, cada gráfico, la tabla de modalidad,
+el layout serializado, la exportación a Excel (exportar_excel) y cada ruta
+/exportar/*, leída completa y validada (un error dentro del streaming
+llega con estado 200 y el archivo cortado, así que hay que abrirlo).
+
+Además controla el tamaño del JSON de /_dash-layout, que cada visitante
+descarga antes del primer render: si pasa de --presupuesto-layout KB el
+benchmark termina con código 1 (para usarlo en CI). Con --solo-layout
+solo carga cada libro y mide el layout, sin las etapas cronometradas; desde
+otro script, tamano_layout_kb(app) mide el snapshot publicado.
+
+Uso:
+    python benchmark.py 1000 10000 100000 --repeticiones 3
+    python benchmark.py 1000000 --json resultados.json
+    python benchmark.py 1000 --presupuesto-layout 25
+    python benchmark.py 1000 --solo-layout
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import plotly.utils
+
+from generar_becarios import obtener_libro
+
+DIRECTORIO_LIBROS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_becarios", "benchmark")
+# KB del layout serializado; los estilos repetidos van en assets/estilos.css
+PRESUPUESTO_LAYOUT_KB = 25
+
+def medir(funcion, repeticiones, preparar=None):
+    """(segundos del mejor intento, pico de memoria en bytes, resultado)"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    try:
+        resultado = funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return mejor, pico, resultado
+
+def layout_serializado(app):
+    """JSON de /_dash-layout para el snapshot publicado"""
+    return json.dumps(app.layout_principal(), cls=plotly.utils.PlotlyJSONEncoder)
+
+def tamano_layout_kb(app):
+    """KB del layout serializado que descarga cada visitante"""
+    return len(layout_serializado(app).encode("utf-8")) / 1024
+
+def cargar_libro(app, ruta):
+    """Lee, clasifica y publica el libro como lo haría la carga de la app"""
+    fuente = app.descargar_fuente(ruta)[0]
+    df = app.clasificar_becarios(app.leer_becarios(fuente))
+    snap = app.construir_snapshot(df, f"benchmark-{len(df)}", fuente)
+    app.publicar_snapshot(snap)
+    return snap
+
+def leer_exportacion(app, formato):
+    """Descarga completa de /exportar/<nombre>.<formato>; falla si el archivo no se puede abrir"""
+    respuesta = app.app.server.test_client().get(f"/exportar/{app.NOMBRE_EXPORTACION}.{formato}")
+    cuerpo = respuesta.get_data()
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"/exportar/*.{formato} respondió {respuesta.status_code}")
+    if formato == "csv.zip":
+        with zipfile.ZipFile(io.BytesIO(cuerpo)) as archivo:
+            if archivo.testzip() is not None or "Resumen General.csv" not in archivo.namelist():
+                raise RuntimeError("zip de CSV incompleto")
+    elif formato == "parquet":
+        import pyarrow.parquet as pq
+        if b"resumen" not in pq.read_schema(io.BytesIO(cuerpo)).metadata:
+            raise RuntimeError("Parquet sin el resumen en los metadatos")
+        pq.read_table(io.BytesIO(cuerpo))
+    return len(cuerpo)
+
+def etapas(app, ruta):
+    """Lista de (etapa, función, preparar); cada función recibe el estado acumulado"""
+    estado = {}
+
+    def excel_en_frio():
+        # Fuerza a regenerar el Excel: sin archivos en disco ni memo en el snapshot
+        estado["snap"].cache.pop("excel", None)
+        estado["snap"].cache.pop("completo", None)
+        for nombre in os.listdir(app.CACHE_DIR):
+            if nombre.startswith(("export_", "completo_")):
+                os.remove(os.path.join(app.CACHE_DIR, nombre))
+
+    def publicar():
+        app.publicar_snapshot(estado["snap"])
+        excel_en_frio()
+
+    lista = [
+        ("descarga", lambda: estado.update(fuente=app.descargar_fuente(ruta)[0]), None),
+        ("lectura_excel", lambda: estado.update(df=app.leer_becarios(estado["fuente"])), None),
+        ("lectura_excel_completa", lambda: app.leer_becarios(estado["fuente"], completo=True), None),
+        ("clasificacion", lambda: estado.update(df_clasificado=app.clasificar_becarios(estado["df"].copy())), None),
+        ("cubo", lambda: estado.update(cubo=app.construir_cubo(
+            estado["df_clasificado"], app.par_por_defecto(app.periodos_becarios(estado["df_clasificado"]))
+        )), None),
+        ("snapshot", lambda: estado.update(
+            snap=app.construir_snapshot(estado["df_clasificado"], f"benchmark-{len(estado['df'])}", estado["fuente"])
+        ), None),
+    ]
+    for nombre, construir in app.CONSTRUCTORES_FIGURAS.items():
+        lista.append((
+            f"grafico_{nombre}",
+            lambda construir=construir: construir(estado["snap"], estado["snap"].cubo, estado["snap"].par),
+            None,
+        ))
+    lista += [
+        ("tabla_modalidad", lambda: app.tabla_modalidad_niveles(
+            estado["snap"].cubo, estado["snap"].hay_modalidad
+        ), None),
+        ("layout", lambda: layout_serializado(app), publicar),
+        ("descargar_excel", lambda: app.exportar_excel(1), excel_en_frio),
+    ]
+    for formato in app.FORMATOS_EXPORTACION:
+        lista.append((f"exportar_{formato}", lambda formato=formato: leer_exportacion(app, formato), None))
+    return lista
+
+def importar_app():
+    # Sin carga automática al importar: cada etapa se ejecuta a mano, con una
+    # cache temporal para no tocar la cache real
+    os.environ["BECARIOS_CARGA_AUTOMATICA"] = "false"
+    os.environ["BECARIOS_CACHE_DIR"] = tempfile.mkdtemp(prefix="benchmark_becarios_")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    return app
+
+def correr(tamanos, repeticiones, directorio, semilla):
+    libros = {n: obtener_libro(directorio, n, semilla) for n in tamanos}
+    app = importar_app()
+
+    resultados = []
+    for n in tamanos:
+        for etapa, funcion, preparar in etapas(app, libros[n]):
+            segundos, pico, resultado = medir(funcion, repeticiones, preparar)
+            resultados.append({"filas": n, "etapa": etapa, "segundos": segundos, "pico_mb": pico / 2**20})
+            print(f"{n:>9} {etapa:<32} {segundos * 1000:>10.1f} ms {pico / 2**20:>10.1f} MB", flush=True)
+            if etapa == "layout":
+                resultados[-1]["kb"] = len(resultado.encode("utf-8")) / 1024
+                print(f"{n:>9} {'layout_tamano':<32} {resultados[-1]['kb']:>10.1f} KB", flush=True)
+    return resultados
+
+def correr_layout(tamanos, directorio, semilla):
+    """Solo el tamaño del layout de cada libro, sin cronometrar etapas"""
+    libros = {n: obtener_libro(directorio, n, semilla) for n in tamanos}
+    app = importar_app()
+
+    resultados = []
+    for n in tamanos:
+        cargar_libro(app, libros[n])
+        resultados.append({"filas": n, "etapa": "layout", "kb": tamano_layout_kb(app)})
+        print(f"{n:>9} {'layout_tamano':<32} {resultados[-1]['kb']:>10.1f} KB", flush=True)
+    return resultados
+
+def excedidos(resultados, presupuesto_kb):
+    """Tamaños de layout (filas, KB) que superan el presupuesto"""
+    return [(r["filas"], r["kb"]) for r in resultados if r.get("kb", 0) > presupuesto_kb]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de app.py por etapa")
+    parser.add_argument("filas", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="tamaños a medir (p. ej. 1000 10000 100000 1000000)")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--directorio", default=DIRECTORIO_LIBROS, help="carpeta de los libros sintéticos")
+    parser.add_argument("--semilla", type=int, default=2025)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    parser.add_argument("--presupuesto-layout", type=float, default=PRESUPUESTO_LAYOUT_KB,
+                        help="KB máximos del layout serializado (0 para no controlarlo)")
+    parser.add_argument("--solo-layout", action="store_true",
+                        help="solo mide el tamaño del layout (para CI), sin las etapas cronometradas")
+    args = parser.parse_args()
+
+    if args.solo_layout:
+        resultados = correr_layout(sorted(args.filas), args.directorio, args.semilla)
+    else:
+        print(f"{'filas':>9} {'etapa':<32} {'tiempo':>13} {'pico mem':>13}")
+        resultados = correr(sorted(args.filas), args.repeticiones, args.directorio, args.semilla)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.presupuesto_layout:
+        for filas, kb in excedidos(resultados, args.presupuesto_layout):
+            print(f"El layout con {filas} filas pesa {kb:.1f} KB, el presupuesto es {args.presupuesto_layout:g} KB")
+        if excedidos(resultados, args.presupuesto_layout):
+            sys.exit(1)
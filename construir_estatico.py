@@ -0,0 +1,333 @@
+"""
+Genera una versión estática del dashboard: la misma página con los valores
+por defecto (sin filtros, el último par de períodos) ya calculados, para
+servirla desde cualquier servidor de archivos sin trabajo de Python por
+petición. El app Dash queda solo para quien necesita filtrar o buscar.
+
+Carga la base una vez y escribe en el directorio de salida:
+
+    index.html          KPIs, tablas y contenedores de los gráficos
+    figuras/<n>.json    cada gráfico de CONSTRUCTORES_FIGURAS (figura de Plotly)
+    datos.json          versión, períodos, KPIs y los datos de cada tabla
+    plotly.min.js       para no depender de un CDN
+    estilos.css         la hoja de estilos del dashboard (assets/)
+    <NOMBRE_EXCEL>      la misma exportación que descarga el dashboard
+
+Junto a cada .html/.json/.js/.css queda su versión .gz, para servidores que
+entregan archivos precomprimidos (gzip_static de nginx). El directorio se
+arma aparte y se reemplaza al final; si la versión de los datos no cambió
+desde la última corrida no se regenera nada (salvo con --forzar).
+
+Uso:
+    python construir_estatico.py estatico
+    BECARIOS_URL=/ruta/becarios.xlsx python construir_estatico.py /var/www/becarios --forzar
+"""
+import argparse
+import gzip
+import html as html_texto
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+import plotly.offline
+import plotly.utils
+
+# Gráficos en el orden y ancho (columnas de 12) en que aparecen en el dashboard
+FILAS_GRAFICOS = [
+    [("riesgo", 8), ("tabla_riesgo", 4)],
+    [("transiciones", 8), ("tabla_transiciones", 4)],
+    [("no_encontrado", 12)],
+    [("empeoraron_modalidad", 7), ("riesgo_psicologico", 5)],
+]
+
+# Propiedades CSS numéricas que no llevan "px"
+SIN_UNIDAD = {"fontWeight", "opacity", "lineHeight", "zIndex", "flex", "flexGrow", "flexShrink", "order"}
+
+# ================================
+#  COMPONENTES DASH A HTML
+# ================================
+def estilo_css(estilo):
+    declaraciones = []
+    for propiedad, valor in (estilo or {}).items():
+        if isinstance(valor, (int, float)) and valor != 0 and propiedad not in SIN_UNIDAD:
+            valor = f"{valor}px"
+        nombre = re.sub(r"([A-Z])", r"-\1", propiedad).lower()
+        declaraciones.append(f"{nombre}: {valor}")
+    return "; ".join(declaraciones)
+
+def atributos(props, clases=()):
+    clases = [*clases, props.get("className")]
+    pares = [("class", " ".join(c for c in clases if c)), ("style", estilo_css(props.get("style")))]
+    pares += [(clave, props.get(clave)) for clave in ("id", "href", "title")]
+    pares += [(clave, valor) for clave, valor in props.items() if clave.startswith("data-")]
+    return "".join(f' {clave}="{html_texto.escape(str(valor))}"' for clave, valor in pares if valor)
+
+def clases_columna(props):
+    clases = [f"col-{tamano}-{props[tamano]}" for tamano in ("sm", "md", "lg", "xl") if props.get(tamano)]
+    if props.get("width"):
+        return [f"col-{props['width']}", *clases]
+    return clases or ["col"]
+
+# Componentes de dash_bootstrap_components que se usan en la página: su clase de Bootstrap
+CLASES_BOOTSTRAP = {
+    "Card": lambda props: ["card"],
+    "CardBody": lambda props: ["card-body"],
+    "Row": lambda props: ["row"],
+    "Col": clases_columna,
+    "Container": lambda props: ["container-fluid" if props.get("fluid") else "container"],
+}
+
+def estilo_condicional(reglas, fila, columna):
+    """Combina las reglas style_*_conditional de DataTable que aplican a esta celda"""
+    estilo = {}
+    for regla in reglas or []:
+        condicion = regla.get("if", {})
+        indice = condicion.get("row_index")
+        if indice == "odd" and fila % 2 == 0 or indice == "even" and fila % 2 == 1:
+            continue
+        if isinstance(indice, int) and indice != fila:
+            continue
+        columnas = condicion.get("column_id")
+        if columnas is not None and columna not in (columnas if isinstance(columnas, list) else [columnas]):
+            continue
+        estilo.update({k: v for k, v in regla.items() if k != "if"})
+    return estilo
+
+def tabla_html(props):
+    """Un DataTable como <table>, con los estilos de encabezado, celda y condicionales"""
+    columnas = props.get("columns") or []
+    celda = props.get("style_cell") or {}
+    encabezado = {**celda, **(props.get("style_header") or {})}
+    partes = [f'<div style="{estilo_css(props.get("style_table"))}">',
+              '<table style="width: 100%; border-collapse: collapse"><thead><tr>']
+    for columna in columnas:
+        partes.append(f'<th style="{estilo_css(encabezado)}">{html_texto.escape(str(columna["name"]))}</th>')
+    partes.append("</tr></thead><tbody>")
+    for fila, registro in enumerate(props.get("data") or []):
+        partes.append("<tr>")
+        for columna in columnas:
+            estilo = {
+                **celda,
+                **estilo_condicional(props.get("style_cell_conditional"), fila, columna["id"]),
+                **estilo_condicional(props.get("style_data_conditional"), fila, columna["id"]),
+            }
+            valor = registro.get(columna["id"], "")
+            partes.append(f'<td style="{estilo_css(estilo)}">{html_texto.escape(str(valor))}</td>')
+        partes.append("</tr>")
+    partes.append("</tbody></table></div>")
+    return "".join(partes)
+
+def a_html(componente):
+    """HTML estático de un árbol de componentes (html, dbc y DataTable)"""
+    if componente is None:
+        return ""
+    if isinstance(componente, (list, tuple)):
+        return "".join(a_html(hijo) for hijo in componente)
+    if isinstance(componente, (str, int, float)):
+        return html_texto.escape(str(componente))
+
+    datos = componente.to_plotly_json()
+    tipo, espacio, props = datos["type"], datos["namespace"], datos["props"]
+    if tipo == "DataTable":
+        return tabla_html(props)
+    if espacio == "dash_html_components":
+        etiqueta, clases = tipo.lower(), []
+    elif tipo in CLASES_BOOTSTRAP:
+        etiqueta, clases = "div", CLASES_BOOTSTRAP[tipo](props)
+    else:
+        raise ValueError(f"Componente sin versión estática: {espacio}.{tipo}")
+    if etiqueta in ("br", "hr"):
+        return f"<{etiqueta}{atributos(props, clases)}>"
+    return f"<{etiqueta}{atributos(props, clases)}>{a_html(props.get('children'))}</{etiqueta}>"
+
+# ================================
+#  PÁGINA
+# ================================
+def titulo(app, texto, color, nivel="H3"):
+    return getattr(app.html, nivel)(texto, className="titulo-seccion", style={'color': color})
+
+def bloque_tabla(app, texto, tabla):
+    return app.html.Div([app.html.H5(texto), tabla], className="recuadro recuadro-tabla")
+
+def contenido_estatico(app, snap):
+    """La página del dashboard con los valores por defecto y sin controles interactivos"""
+    html, dbc, colores = app.html, app.dbc, app.COLORS
+    tablas = {
+        "tabla_riesgo": bloque_tabla(app, "📋 Resumen por Período", app.obtener_tabla_riesgo(snap)),
+        "tabla_transiciones": bloque_tabla(app, "🔀 Matriz de Transición", app.obtener_tabla_transicion(snap)),
+    }
+    filas = []
+    for fila in FILAS_GRAFICOS:
+        columnas = []
+        for nombre, ancho in fila:
+            if nombre in tablas:
+                contenido = tablas[nombre]
+            else:
+                contenido = html.Div(
+                    html.Div(**{"data-figura": f"figuras/{nombre}.json", "className": "grafico-diferido"}),
+                    className="recuadro"
+                )
+            columnas.append(dbc.Col(contenido, lg=ancho, md=12))
+        filas.append(dbc.Row(columnas, className="mb-5"))
+
+    return html.Div([
+        app.encabezado(),
+        dbc.Container([
+            titulo(app, "📈 Indicadores Clave", colores['primary']),
+            dbc.Row(app.obtener_kpis(snap), className="mb-4"),
+            html.Hr(className="separador"),
+            titulo(app, "📊 Análisis Visual", colores['primary']),
+            *filas[:3],
+            titulo(app, "🔍 Análisis Detallado - Estudiantes que Empeoraron", colores['danger']),
+            filas[3],
+            titulo(app, f"Distribución de Niveles por Modalidad ({snap.par[1]})", colores['warning'], "H5"),
+            dbc.Row(dbc.Col(html.Div(app.obtener_tabla_modalidad(snap), className="recuadro"), lg=12), className="mb-5"),
+            html.Hr(className="separador"),
+            html.Div([
+                html.A("Descargar Excel Completo", href=app.NOMBRE_EXCEL,
+                       className="btn btn-success btn-lg boton-descarga"),
+                html.P("Para filtrar o buscar becarios, usa el dashboard interactivo",
+                       style={'color': '#888', 'fontSize': '0.85rem', 'marginTop': '15px'}),
+            ], className="text-center"),
+            html.Hr(className="separador-final"),
+            html.Div(html.P([
+                "Dashboard de Análisis Académico | ",
+                html.Strong("Población: Becarios"),
+                f" | Comparativa Riesgo Académico {' · '.join(snap.periodos)}",
+                html.Br(),
+                f"Versión de los datos {snap.version} · generado el {time.strftime('%Y-%m-%d %H:%M')}"
+            ]), className="pie-pagina"),
+        ], fluid=True),
+    ], className="pagina")
+
+# Cada contenedor con data-figura carga su JSON al abrir la página
+PLANTILLA_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{titulo}</title>
+<link rel="stylesheet" href="{bootstrap}">
+<link rel="stylesheet" href="estilos.css">
+<script src="plotly.min.js"></script>
+</head>
+<body>
+{cuerpo}
+<script>
+document.querySelectorAll("[data-figura]").forEach(function (contenedor) {{
+    fetch(contenedor.dataset.figura)
+        .then(function (respuesta) {{ return respuesta.json(); }})
+        .then(function (figura) {{ Plotly.newPlot(contenedor, figura.data, figura.layout, {{responsive: true}}); }});
+}});
+</script>
+</body>
+</html>
+"""
+
+# ================================
+#  CONSTRUCCIÓN DEL DIRECTORIO
+# ================================
+def escribir(ruta, texto):
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(texto)
+
+def comprimir_archivos(directorio):
+    for carpeta, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            if nombre.endswith((".html", ".json", ".js", ".css")):
+                ruta = os.path.join(carpeta, nombre)
+                with open(ruta, "rb") as origen, gzip.open(f"{ruta}.gz", "wb", compresslevel=9) as destino:
+                    shutil.copyfileobj(origen, destino)
+
+def datos_tabla(tabla):
+    # tabla_modalidad_niveles devuelve un aviso (html.Div) cuando no hay datos
+    return getattr(tabla, "data", None)
+
+def version_publicada(destino):
+    try:
+        with open(os.path.join(destino, "datos.json"), encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+def escribir_estatico(app, snap, directorio):
+    os.makedirs(os.path.join(directorio, "figuras"))
+    for nombre in app.CONSTRUCTORES_FIGURAS:
+        escribir(os.path.join(directorio, "figuras", f"{nombre}.json"), app.obtener_figura(snap, nombre).to_json())
+
+    datos = {
+        "version": snap.version,
+        "generado": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "periodos": snap.periodos,
+        "par": snap.par,
+        "kpis": dict(zip(
+            ["total_becarios", "mejoraron", "empeoraron", "se_mantuvieron"],
+            [snap.total_becarios, snap.mejoraron, snap.empeoraron, snap.se_mantuvieron]
+        )),
+        "tablas": {
+            "riesgo": datos_tabla(app.obtener_tabla_riesgo(snap)),
+            "transiciones": datos_tabla(app.obtener_tabla_transicion(snap)),
+            "modalidad": datos_tabla(app.obtener_tabla_modalidad(snap)),
+        },
+        "figuras": {nombre: f"figuras/{nombre}.json" for nombre in app.CONSTRUCTORES_FIGURAS},
+        "excel": app.NOMBRE_EXCEL,
+    }
+    escribir(os.path.join(directorio, "datos.json"),
+             json.dumps(datos, cls=plotly.utils.PlotlyJSONEncoder, ensure_ascii=False, indent=2))
+
+    escribir(os.path.join(directorio, "index.html"), PLANTILLA_HTML.format(
+        titulo=html_texto.escape(app.app.title),
+        bootstrap=app.dbc.themes.BOOTSTRAP,
+        cuerpo=a_html(contenido_estatico(app, snap)),
+    ))
+    escribir(os.path.join(directorio, "plotly.min.js"), plotly.offline.get_plotlyjs())
+    shutil.copyfile(os.path.join(app.app.config.assets_folder, "estilos.css"), os.path.join(directorio, "estilos.css"))
+
+    ruta_excel, _ = app.obtener_excel(snap)
+    shutil.copyfile(ruta_excel, os.path.join(directorio, app.NOMBRE_EXCEL))
+    comprimir_archivos(directorio)
+
+def construir(destino, forzar=False):
+    """Escribe la versión estática en destino. Devuelve False si ya estaba al día"""
+    # Sin carga automática al importar: la base se lee una sola vez, aquí
+    os.environ["BECARIOS_CARGA_AUTOMATICA"] = "false"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+
+    snap = app.cargar_datos_iniciales()
+    if snap is None:
+        raise SystemExit(f"No se pudieron cargar los datos: {app.error_carga()}")
+    if not forzar and version_publicada(destino) == snap.version:
+        return False
+
+    # Se arma en un directorio aparte y se cambia al final, así el servidor
+    # nunca entrega una mezcla de la versión anterior y la nueva
+    destino = os.path.abspath(destino)
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    anterior = f"{destino}.{os.getpid()}.anterior"
+    shutil.rmtree(temporal, ignore_errors=True)
+    try:
+        escribir_estatico(app, snap, temporal)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    if os.path.exists(destino):
+        os.rename(destino, anterior)
+    os.rename(temporal, destino)
+    shutil.rmtree(anterior, ignore_errors=True)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera la versión estática del dashboard")
+    parser.add_argument("destino", nargs="?", default="estatico", help="directorio de salida")
+    parser.add_argument("--forzar", action="store_true", help="regenera aunque la versión de los datos no cambió")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if construir(args.destino, args.forzar):
+        print(f"Versión estática en {args.destino} ({time.perf_counter() - inicio:.1f} s)")
+    else:
+        print(f"{args.destino} ya tiene esta versión de los datos")
@@ -0,0 +1,114 @@
+"""
+Genera libros Excel sintéticos con la forma de la base BECARIOS.
+
+Los encabezados y los valores "sucios" imitan a la hoja real (saltos de
+línea y dobles espacios en los encabezados, niveles escritos de varias
+formas, celdas vacías), así que después de normalizar_columnas el libro
+tiene las mismas columnas que la base de Drive.
+
+Uso:
+    python generar_becarios.py 1000 100000 --directorio /tmp/becarios
+"""
+import argparse
+import os
+
+import numpy as np
+from openpyxl import Workbook
+
+ENCABEZADOS = [
+    "N°",
+    "APELLIDOS Y NOMBRES",
+    "TIPO DE\nBENEFICIO",
+    "MODALIDAD",
+    "CARRERA",
+    "RIESGO ACADÉMICO  2025-1",
+    "RIESGO ACADÉMICO\n2025-2",
+    "RIESGO PSICOLÓGICO INICIAL 2025-2",
+    "CORREO",
+    "OBSERVACIONES",
+]
+
+APELLIDOS = np.array([
+    "Pérez", "Núñez", "Quispe", "Mamani", "García", "Rodríguez", "Flores", "Sánchez",
+    "Ramírez", "Chávez", "Torres", "Vásquez", "Gómez", "Díaz", "Castillo", "Mendoza",
+    "Huamán", "Rojas", "Cóndor", "Gutiérrez", "Ibáñez", "Ñahui", "López", "Saldaña",
+])
+NOMBRES = np.array([
+    "José", "María", "Lucía", "Ángel", "Andrés", "Sofía", "Jesús", "Martín", "Valeria",
+    "Inés", "Raúl", "Camila", "Joaquín", "Dayana", "Óscar", "Ximena", "Héctor", "Rocío",
+])
+BENEFICIOS = (["BECA", "CREDITO", "SEMI BECA"], [0.6, 0.3, 0.1])
+MODALIDADES = (
+    ["BECA 18", "Beca Integral", "CNA", "Convenio X", "Beca Deportiva", "Beca Socioeconómica"],
+    [0.35, 0.2, 0.15, 0.12, 0.08, 0.1],
+)
+CARRERAS = ["Ingeniería Civil", "Derecho", "Psicología", "Administración", "Enfermería", "Contabilidad"]
+
+# Cada nivel aparece escrito de varias formas, como en la hoja original
+RIESGO_SUCIO = (
+    ["Bajo", "Riesgo Bajo", "BAJO ", "bajo", "MEDIO ", "Medio", "Riesgo Medio",
+     "ALTO", "alto", " Riesgo Alto", "sin dato", "NE", "-", None],
+    [0.18, 0.12, 0.08, 0.04, 0.12, 0.08, 0.04, 0.08, 0.04, 0.04, 0.04, 0.03, 0.03, 0.08],
+)
+PSICOLOGICO_SUCIO = (
+    ["Bajo", "Riesgo Bajo", "MEDIO ", "Medio", "alto", "ALTO", "NE", "sin dato", None],
+    [0.2, 0.1, 0.12, 0.08, 0.05, 0.05, 0.1, 0.05, 0.25],
+)
+
+def elegir(rng, opciones, n):
+    valores, pesos = opciones
+    return np.array(valores, dtype=object)[rng.choice(len(valores), size=n, p=pesos)]
+
+def generar_becarios(n_filas, ruta, semilla=2025):
+    """Escribe un libro con la hoja BECARIOS de n_filas becarios"""
+    rng = np.random.default_rng(semilla)
+    nombres = (
+        APELLIDOS[rng.integers(len(APELLIDOS), size=n_filas)].astype(object) + " "
+        + APELLIDOS[rng.integers(len(APELLIDOS), size=n_filas)].astype(object) + ", "
+        + NOMBRES[rng.integers(len(NOMBRES), size=n_filas)].astype(object) + " "
+        + NOMBRES[rng.integers(len(NOMBRES), size=n_filas)].astype(object)
+    )
+    columnas = [
+        range(1, n_filas + 1),
+        nombres,
+        elegir(rng, BENEFICIOS, n_filas),
+        elegir(rng, MODALIDADES, n_filas),
+        np.array(CARRERAS, dtype=object)[rng.integers(len(CARRERAS), size=n_filas)],
+        elegir(rng, RIESGO_SUCIO, n_filas),
+        elegir(rng, RIESGO_SUCIO, n_filas),
+        elegir(rng, PSICOLOGICO_SUCIO, n_filas),
+        [f"becario{i}@correo.edu.pe" for i in range(n_filas)],
+        np.where(rng.random(n_filas) < 0.05, "Revisar documentos", None),
+    ]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("BECARIOS")
+    ws.append(ENCABEZADOS)
+    for fila in zip(*columnas):
+        ws.append(fila)
+
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    wb.save(temporal)
+    os.replace(temporal, ruta)
+    return ruta
+
+def ruta_libro(directorio, n_filas, semilla=2025):
+    return os.path.join(directorio, f"becarios_sinteticos_{n_filas}_s{semilla}.xlsx")
+
+def obtener_libro(directorio, n_filas, semilla=2025):
+    """Reutiliza el libro si ya se generó con el mismo tamaño y semilla"""
+    ruta = ruta_libro(directorio, n_filas, semilla)
+    if not os.path.exists(ruta):
+        os.makedirs(directorio, exist_ok=True)
+        generar_becarios(n_filas, ruta, semilla)
+    return ruta
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera libros BECARIOS sintéticos")
+    parser.add_argument("filas", type=int, nargs="+", help="número de becarios por libro")
+    parser.add_argument("--directorio", default=".", help="carpeta de salida")
+    parser.add_argument("--semilla", type=int, default=2025)
+    args = parser.parse_args()
+
+    for n in args.filas:
+        print(generar_becarios(n, ruta_libro(args.directorio, n, args.semilla), args.semilla))
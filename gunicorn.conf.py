@@ -0,0 +1,52 @@
+# ================================
+#  CONFIGURACIÓN DE GUNICORN
+# ================================
+# gunicorn lee este archivo automáticamente al ejecutar `gunicorn app:server`.
+#
+# Con preload_app la base de becarios vive en el proceso maestro y los workers
+# la comparten por copy-on-write después del fork, así la memoria por worker
+# no crece con el número de workers. El maestro no carga al arrancar: los
+# workers aparecen enseguida con la página de "cargando datos", uno de ellos
+# lee la fuente, deja la cache Parquet y el Excel en disco y le envía SIGHUP
+# al maestro; el maestro carga desde esa cache (on_reload) y crea workers
+# nuevos con los datos. Cada cambio posterior de la fuente sigue el mismo
+# camino, así los datos siguen compartidos después de cada actualización.
+# Mientras el maestro carga no atiende señales ni vigila a los workers; los
+# workers anteriores siguen respondiendo hasta que lo reemplazan los nuevos.
+#
+# Con BECARIOS_PRELOAD=false cada worker carga y refresca su propia copia:
+# no hay recreación de workers, pero la memoria crece con WEB_CONCURRENCY y
+# cada worker vuelve a leer la fuente cuando cambia.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = os.environ.get("BECARIOS_PRELOAD", "true").lower() == "true"
+
+if preload_app:
+    # app.py no carga ni refresca en el maestro por su cuenta (ver MODO_PRELOAD)
+    os.environ["BECARIOS_MODO_PRELOAD"] = "1"
+
+def when_ready(server):
+    if preload_app:
+        # Los objetos ya cargados quedan fuera del recolector de basura: así el
+        # GC de cada worker no escribe en esas páginas y siguen compartidas
+        gc.freeze()
+
+def on_reload(server):
+    if preload_app:
+        # SIGHUP de un worker: hay datos nuevos en la cache. El snapshot
+        # anterior se libera antes de congelar el nuevo para los próximos workers
+        import app
+        gc.unfreeze()
+        app.recargar_en_maestro()
+        gc.collect()
+        gc.freeze()
+
+def post_fork(server, worker):
+    if preload_app:
+        # Un worker a la vez vigila la fuente; ninguno publica snapshots propios
+        import app
+        app.iniciar_refresco()
@@ -0,0 +1,76 @@
+"""
+Lectores de hojas de Excel, sin dependencias de app.py (solo pandas y
+openpyxl). app.py los usa en su propio proceso, y también ejecuta este
+archivo como script para parsear cada hoja auxiliar en otro proceso de
+Python: así el parseo, que en openpyxl es Python puro y no suelta el GIL,
+corre en paralelo con el de BECARIOS. Como script no importa app.py, así
+que el proceso no carga datos ni arranca el refresco.
+
+Uso (lo llama app.leer_hoja_aparte):
+    python lector_hojas.py <libro.xlsx> <hoja> <motor> <destino.pkl>
+"""
+import sys
+
+import openpyxl
+import pandas as pd
+
+def leer_hoja_pandas(ruta, hoja, seleccionar=None, motor="openpyxl"):
+    with pd.ExcelFile(ruta, engine=motor) as libro:
+        columnas = seleccionar(libro.parse(hoja, nrows=0).columns) if seleccionar else None
+        return libro.parse(hoja, usecols=columnas)
+
+def nombres_columnas(encabezados):
+    """
+    Nombres de columna como los arma read_excel: "Unnamed: i" para los
+    encabezados vacíos y X.1, X.2... para los repetidos (sin chocar con
+    otro encabezado que ya se llame así)
+    """
+    nombres = [f"Unnamed: {i}" if e is None else str(e) for i, e in enumerate(encabezados)]
+    originales = set(nombres)
+    usados = {}
+    # Como en pandas, primero los encabezados con nombre y luego los vacíos
+    for i in sorted(range(len(nombres)), key=lambda i: encabezados[i] is None):
+        base = nombre = nombres[i]
+        repeticiones = usados.get(base, 0)
+        while repeticiones > 0:
+            usados[base] = repeticiones + 1
+            nombre = f"{base}.{repeticiones}"
+            repeticiones = repeticiones + 1 if nombre in originales else usados.get(nombre, 0)
+        usados[nombre] = repeticiones + 1
+        nombres[i] = nombre
+    return nombres
+
+def leer_hoja_openpyxl(ruta, hoja, seleccionar=None):
+    """
+    Recorre la hoja con openpyxl en modo read_only y solo convierte las
+    celdas de las columnas elegidas (pandas convierte todas). Las filas son
+    las mismas que da read_excel (solo se quitan las vacías del final de la
+    hoja), así la lectura completa para exportar queda alineada con esta
+    """
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro[hoja].iter_rows(values_only=True)
+        nombres = nombres_columnas(next(filas, ()))
+        posiciones = seleccionar(nombres) if seleccionar else range(len(nombres))
+        datos = [[] for _ in posiciones]
+        con_datos = 0
+        for numero, fila in enumerate(filas, start=1):
+            for lista, i in zip(datos, posiciones):
+                lista.append(fila[i] if i < len(fila) else None)
+            if any(v is not None for v in fila):
+                con_datos = numero
+    finally:
+        libro.close()
+    return pd.DataFrame({nombres[i]: lista[:con_datos] for i, lista in zip(posiciones, datos)})
+
+# Lectores intercambiables (BECARIOS_MOTOR_EXCEL). Todos reciben la ruta, la
+# hoja y una función que elige posiciones de columnas a partir de los encabezados
+LECTORES_EXCEL = {
+    "openpyxl": leer_hoja_openpyxl,
+    "calamine": lambda ruta, hoja, seleccionar=None: leer_hoja_pandas(ruta, hoja, seleccionar, "calamine"),
+    "pandas": leer_hoja_pandas,
+}
+
+if __name__ == "__main__":
+    ruta, hoja, motor, destino = sys.argv[1:]
+    LECTORES_EXCEL[motor](ruta, hoja).to_pickle(destino)